@@ -1,11 +1,20 @@
 from llm_client import chat_with_model
+from tracing import traced
 
-def code_agent(log_summary, source_code):
+
+@traced("agent.code", kind="agent")
+def code_agent(log_summary, source_code, similar_incident=None):
     print("🤖 Code Agent: Analyzing source code...\n")
+    # Matched on text similarity only: a lead to check against the code, not a conclusion
+    hint = (
+        "A past incident that looks similar (unverified, ignore it if the code does not support it):\n"
+        f"{similar_incident}\n"
+    ) if similar_incident else ""
     prompt = (
         f"The following error was found in logs:\n'{log_summary}'\n"
         "Here is the relevant source code:\n"
         f"{source_code}\n"
+        f"{hint}"
         "Analyze the source code and identify the most probable root cause. "
         "Provide the specific code block (function, method, or class) where the issue likely occurred, "
         "and explain your reasoning."
@@ -1,10 +1,13 @@
-import json
 import re
-import csv
 import os
-from llm_client import chat_with_model
-from vector_db_client import get_relevant_context  # Ensure this is implemented
-
+from llm_client import chat_with_model, LLMError
+from agents.db_context import DBLoopContext, ResultDigest, export_result
+from agents.db_diagnostics import select_categories, run_diagnostics
+from db_pool import get_pool, check_sql_allowed, split_statements, execute_guarded, is_connection_error, UnsafeSQLError
+from tracing import span, traced
+from pipeline import check_cancelled
+
+@traced("agent.db", kind="agent")
 def db_agent(config):
     """
     Uses LLM to iteratively generate diagnostics, runs SQL queries, and exports results to CSV.
@@ -14,12 +17,19 @@ def db_agent(config):
             'code_analysis': str,
             'db_conn_str': (optional) pyodbc connection string,
             'log_file': (optional) path to log file,
-            'output_dir': (optional) directory to save CSV files
+            'output_dir': (optional) directory to save CSV files,
+            'token_budget': (optional) max tokens of previous results sent to the LLM,
+            'max_rows': (optional) max rows exported per query (default 100000),
+            'compress_results': (optional) write results as .csv.gz,
+            'decision': (optional) decision agent output, used to pick diagnostics,
+            'max_llm_steps': (optional) max LLM drill-down queries after the canned diagnostics (default 3)
+            'similar_incident': (optional) summary of a past incident that looks similar, as an unverified hint
         }
     Returns:
         str: Human-readable analysis.
     """
-    import pyodbc
+    # numpy/faiss are only loaded when the DB agent actually runs
+    from vector_db_client import get_relevant_context
     log_file = config.get("log_file", "db_agent.log")
     output_dir = config.get("output_dir", "output")
     os.makedirs(output_dir, exist_ok=True)
@@ -36,101 +46,149 @@ def db_agent(config):
 
         # Keep only first SELECT/DBCC/EXEC query if multiple exist
         match = re.search(r"(SELECT|DBCC|EXEC|WITH)\s.*", cleaned, re.IGNORECASE | re.DOTALL)
-        return match.group(0).strip() if match else cleaned
+        cleaned = match.group(0).strip() if match else cleaned
+        statements = split_statements(cleaned)
+        cleaned = statements[0] if statements else cleaned
+
+        # Raises UnsafeSQLError for anything that is not a read-only diagnostic query
+        return check_sql_allowed(cleaned)
 
 
     log_summary = config.get("log_summary", "")
     code_analysis = config.get("code_analysis", "")
     db_conn_str = config.get("db_conn_str")
+    max_rows = config.get("max_rows", 100000)
+    compress_results = config.get("compress_results", False)
+    result_ext = "csv.gz" if compress_results else "csv"
+    max_llm_steps = config.get("max_llm_steps", 3)
     context = {
         "log_summary": log_summary,
         "code_analysis": code_analysis,
-        "previous_results": []
+        "rag_context": "",
+        # Full results stay in the CSV files, the LLM only sees a bounded digest
+        "previous_results": DBLoopContext(token_budget=config.get("token_budget", 3000))
     }
 
     if db_conn_str:
         try:
-            conn = pyodbc.connect(db_conn_str)
-            cursor = conn.cursor()
-            for step in range(10):
-                rag_context = get_relevant_context(query=json.dumps(context["previous_results"]), top_k=3)
-
-                prompt = f"""
-                    You are an expert SQL Server DBA.
-                    Goal: Identify root causes of issues such as:
-                    - Long-running or blocking queries
-                    - Missing indexes
-                    - Memory/TempDB bottlenecks
-                    - Database size or file growth issues
-                    - High waits or deadlocks
-
-                    **Rules for your response:**
-                    - Output ONLY ONE valid T-SQL query.
-                    - Do NOT add explanations, markdown, comments, or multiple queries.
-                    - Do NOT use fictitious columns like 'percentage_used' or 'total_rows_returned_by_cursor_at_row...'.
-                    - If enough information is already collected, reply ONLY with the word: DONE.
-
-                    Example valid query:
-                    SELECT TOP 10
-                        session_id, status, command, blocking_session_id,
-                        wait_type, wait_time, cpu_time, total_elapsed_time
-                    FROM sys.dm_exec_requests
-                    ORDER BY total_elapsed_time DESC;
-
-                    Now, based on this context:
-                    Relevant context:
-                    {context['rag_context']}
-                    Log summary:
-                    {context['log_summary']}
-
-                    Code analysis:
-                    {context['code_analysis']}
-
-                    Previous query results:
-                    {json.dumps(context['previous_results'], indent=2)}
-
-                    Suggest ONE next diagnostic query or reply DONE.
-                    """
-
-                sql_suggestion = chat_with_model(prompt).strip()
-                log(f"LLM suggested SQL query:\n{sql_suggestion}")
-
-                if sql_suggestion.upper() == "DONE":
-                    log("LLM indicated analysis is complete.")
-                    break
-
-                sql_to_run = clean_sql(sql_suggestion)
-
-                try:
-                    cursor.execute(sql_to_run)
-                    rows = cursor.fetchall()
-                    col_names = [desc[0] for desc in cursor.description]
-                    result = [dict(zip(col_names, row)) for row in rows]
-                    context["previous_results"].append({"query": sql_to_run, "result": result})
-
-                    # Export results to CSV
-                    csv_file_path = os.path.join(output_dir, f"query_result_step_{step+1}.csv")
-                    with open(csv_file_path, mode="w", newline="", encoding="utf-8") as csvfile:
-                        writer = csv.DictWriter(csvfile, fieldnames=col_names)
-                        writer.writeheader()
-                        writer.writerows(result)
-                    log(f"Executed: {sql_to_run}\nExported results to {csv_file_path}")
-
-                except Exception as e:
-                    error_msg = str(e)
-                    context["previous_results"].append({"query": sql_to_run, "error": error_msg})
-                    log(f"Error executing: {sql_to_run}\nError: {error_msg}")
-            cursor.close()
-            conn.close()
+            # Standard DMV diagnostics for the issue categories, run concurrently before asking the LLM
+            categories = select_categories(log_summary, config.get("decision"))
+            log(f"Running canned diagnostics for: {', '.join(categories)}")
+            diagnostics = run_diagnostics(db_conn_str, categories, output_dir,
+                                          max_rows=max_rows, compress=compress_results)
+            for name, sql, digest, file_path, error in diagnostics:
+                if error:
+                    context["previous_results"].add_error(sql, error)
+                    log(f"Diagnostic {name} failed: {error}")
+                else:
+                    context["previous_results"].add_result(sql, digest, file_path)
+                    log(f"Diagnostic {name}: {digest.row_count} rows exported to {file_path}")
+            context["previous_results"].recent_steps = max(2, len(diagnostics))
+
+            # Pooled connection with query/lock timeouts and READ UNCOMMITTED (see db_pool)
+            with get_pool(db_conn_str).connection() as conn:
+                cursor = conn.cursor()
+                for step in range(max_llm_steps):
+                    check_cancelled()
+                    rag_query = "\n".join([log_summary[:1000]] + context["previous_results"].queries()[-2:])
+                    context["rag_context"] = get_relevant_context(query=rag_query, top_k=3)
+
+                    prompt = f"""
+                        You are an expert SQL Server DBA.
+                        Goal: Identify root causes of issues such as:
+                        - Long-running or blocking queries
+                        - Missing indexes
+                        - Memory/TempDB bottlenecks
+                        - Database size or file growth issues
+                        - High waits or deadlocks
+
+                        **Rules for your response:**
+                        - Output ONLY ONE valid T-SQL query.
+                        - Do NOT add explanations, markdown, comments, or multiple queries.
+                        - Do NOT use fictitious columns like 'percentage_used' or 'total_rows_returned_by_cursor_at_row...'.
+                        - If enough information is already collected, reply ONLY with the word: DONE.
+
+                        Example valid query:
+                        SELECT TOP 10
+                            session_id, status, command, blocking_session_id,
+                            wait_type, wait_time, cpu_time, total_elapsed_time
+                        FROM sys.dm_exec_requests
+                        ORDER BY total_elapsed_time DESC;
+
+                        Standard diagnostics (blocking, waits, long-running queries, etc.) have already been
+                        collected and are included in the previous query results. Only suggest a follow-up
+                        drill-down query that adds new information.
+
+                        Now, based on this context:
+                        Relevant context:
+                        {context['rag_context']}
+                        Log summary:
+                        {context['log_summary']}
+
+                        Code analysis:
+                        {context['code_analysis']}
+
+                        Previous query results:
+                        {context['previous_results'].render()}
+
+                        Suggest ONE next diagnostic query or reply DONE.
+                        """
+
+                    sql_suggestion = chat_with_model(prompt).strip()
+                    log(f"LLM suggested SQL query:\n{sql_suggestion}")
+
+                    if sql_suggestion.upper() == "DONE":
+                        log("LLM indicated analysis is complete.")
+                        break
+
+                    check_cancelled()
+                    try:
+                        sql_to_run = clean_sql(sql_suggestion)
+                    except UnsafeSQLError as e:
+                        context["previous_results"].add_error(sql_suggestion, f"Rejected by guardrails: {e}")
+                        log(f"Rejected unsafe SQL: {e}")
+                        continue
+
+                    try:
+                        with span("sql.llm_query", kind="sql", step=step + 1, sql=sql_to_run[:2000]) as sql_span:
+                            execute_guarded(cursor, sql_to_run, max_rows=max_rows)
+                            if cursor.description is None:
+                                context["previous_results"].add_result(sql_to_run, ResultDigest([]), None)
+                                log(f"Executed: {sql_to_run}\nNo result set returned.")
+                                continue
+                            col_names = [desc[0] for desc in cursor.description]
+
+                            # Stream results to CSV
+                            csv_file_path = os.path.join(output_dir, f"query_result_step_{step+1}.{result_ext}")
+                            digest = export_result(cursor, csv_file_path, ResultDigest(col_names),
+                                                   max_rows=max_rows, compress=compress_results)
+                            sql_span.set(rows=digest.row_count, truncated=digest.truncated)
+                        context["previous_results"].add_result(sql_to_run, digest, csv_file_path)
+                        capped = " (row cap reached)" if digest.truncated else ""
+                        log(f"Executed: {sql_to_run}\nExported {digest.row_count} rows{capped} to {csv_file_path}")
+
+                    except Exception as e:
+                        if is_connection_error(e):
+                            # Let the pool discard the broken connection instead of reusing it
+                            raise
+                        error_msg = str(e)
+                        context["previous_results"].add_error(sql_to_run, error_msg)
+                        log(f"Error executing: {sql_to_run}\nError: {error_msg}")
+                cursor.close()
+        except LLMError:
+            raise
         except Exception as e:
             log(f"Database connection failed: {e}")
     else:
         log("No database connection string provided. Skipping SQL execution.")
 
+    similar_incident = config.get("similar_incident")
     prompt2 = (
+        (f"A past incident that looks similar (unverified, only use it if the results below support it):\n"
+         f"{similar_incident}\n\n" if similar_incident else "") +
         f"Log summary:\n{log_summary}\n\n"
         f"Code analysis:\n{code_analysis}\n\n"
-        f"SQL query results:\n{context['previous_results']}\n\n"
+        f"SQL query results:\n{context['previous_results'].render_all()}\n\n"
         "Explain likely root causes, recommend query/index/config optimizations, and provide optimized SQL if needed."
     )
     analysis = chat_with_model(prompt2)
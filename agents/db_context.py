@@ -0,0 +1,219 @@
+import os
+import csv
+import gzip
+import json
+import random
+import numbers
+from pipeline import check_cancelled
+
+# Rough token estimate used for the prompt budget (~4 characters per token).
+CHARS_PER_TOKEN = 4
+MAX_VALUE_CHARS = 120
+MAX_DISTINCT_TRACKED = 50
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def short_value(value):
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS] + "..."
+
+
+class ResultDigest:
+    """
+    Compact, incrementally built description of a query result:
+    row count, per-column statistics, the first few rows and a uniform
+    random sample (reservoir) of the remaining rows.
+    """
+
+    def __init__(self, col_names, sample_rows=5, random_rows=3):
+        self.col_names = list(col_names)
+        self.sample_rows = sample_rows
+        self.random_rows = random_rows
+        self.row_count = 0
+        self.truncated = False
+        self.samples = []
+        self.reservoir = []
+        self._random = random.Random(0)
+        self.columns = {name: {"nulls": 0, "min": None, "max": None, "distinct": set(), "numeric_sum": 0.0,
+                               "numeric_count": 0} for name in self.col_names}
+
+    def add_row(self, row):
+        self.row_count += 1
+        if len(self.samples) < self.sample_rows:
+            self.samples.append({name: short_value(value) for name, value in zip(self.col_names, row)})
+        elif self.random_rows:
+            seen = self.row_count - self.sample_rows
+            if len(self.reservoir) < self.random_rows:
+                self.reservoir.append({name: short_value(value) for name, value in zip(self.col_names, row)})
+            else:
+                slot = self._random.randrange(seen)
+                if slot < self.random_rows:
+                    self.reservoir[slot] = {name: short_value(value) for name, value in zip(self.col_names, row)}
+        for name, value in zip(self.col_names, row):
+            stats = self.columns[name]
+            if value is None:
+                stats["nulls"] += 1
+                continue
+            if isinstance(value, numbers.Number) and not isinstance(value, bool):
+                stats["numeric_sum"] += float(value)
+                stats["numeric_count"] += 1
+            try:
+                if stats["min"] is None or value < stats["min"]:
+                    stats["min"] = value
+                if stats["max"] is None or value > stats["max"]:
+                    stats["max"] = value
+            except TypeError:
+                pass
+            if len(stats["distinct"]) <= MAX_DISTINCT_TRACKED:
+                stats["distinct"].add(short_value(value))
+
+    def add_rows(self, rows):
+        for row in rows:
+            self.add_row(row)
+        return self
+
+    def column_stats(self):
+        summary = {}
+        for name, stats in self.columns.items():
+            distinct = len(stats["distinct"])
+            column = {
+                "nulls": stats["nulls"],
+                "distinct": distinct if distinct <= MAX_DISTINCT_TRACKED else f">{MAX_DISTINCT_TRACKED}",
+            }
+            if stats["min"] is not None:
+                column["min"] = short_value(stats["min"])
+                column["max"] = short_value(stats["max"])
+            if stats["numeric_count"]:
+                column["avg"] = round(stats["numeric_sum"] / stats["numeric_count"], 3)
+            summary[name] = column
+        return summary
+
+    def to_dict(self, with_samples=True, with_stats=True):
+        digest = {"row_count": self.row_count, "columns": self.col_names}
+        if self.truncated:
+            digest["truncated"] = True
+        if with_stats and self.row_count > len(self.samples):
+            digest["column_stats"] = self.column_stats()
+        if with_samples:
+            digest["sample_rows"] = self.samples
+            if self.reservoir:
+                digest["random_sample_rows"] = self.reservoir
+        return digest
+
+
+class DBLoopContext:
+    """
+    Bounded context for db_agent's iterative SQL loop.
+    Full results stay on disk (CSV); the LLM gets the most recent steps in detail
+    (stats + sample rows) and a one-line running summary of older steps, trimmed
+    to a token budget so prompt size stays roughly constant across iterations.
+    """
+
+    def __init__(self, token_budget=3000, recent_steps=2):
+        self.token_budget = token_budget
+        self.recent_steps = recent_steps
+        self.steps = []
+
+    def add_result(self, query, digest, csv_path=None):
+        self.steps.append({"query": query, "digest": digest, "csv_path": csv_path})
+
+    def add_error(self, query, error):
+        self.steps.append({"query": query, "error": short_value(error)})
+
+    def _step_line(self, number, step):
+        query = " ".join(step["query"].split())
+        if "error" in step:
+            return f"Step {number}: {short_value(query)} -> ERROR: {step['error']}"
+        digest = step["digest"]
+        rows = f"{digest.row_count}+ rows (capped)" if digest.truncated else f"{digest.row_count} rows"
+        return f"Step {number}: {short_value(query)} -> {rows} (full result: {step['csv_path']})"
+
+    def _step_detail(self, number, step, with_samples=True, with_stats=True):
+        if "error" in step:
+            return {"step": number, "query": step["query"], "error": step["error"]}
+        return {"step": number, "query": step["query"], "result_file": step["csv_path"],
+                **step["digest"].to_dict(with_samples=with_samples, with_stats=with_stats)}
+
+    def render(self, token_budget=None, recent_steps=None):
+        """Previous results for the prompt, within the token budget."""
+        budget = token_budget or self.token_budget
+        recent = self.recent_steps if recent_steps is None else recent_steps
+        if not self.steps:
+            return "None yet."
+
+        older = self.steps[:-recent] if recent else self.steps
+        latest = self.steps[-recent:] if recent else []
+        summary = [self._step_line(i + 1, step) for i, step in enumerate(older)]
+        first_latest = len(older) + 1
+
+        # Drop detail progressively (stats, then samples) until the budget is met
+        for with_stats, with_samples in ((True, True), (False, True), (False, False)):
+            details = [self._step_detail(first_latest + i, step, with_samples, with_stats)
+                       for i, step in enumerate(latest)]
+            text = ""
+            if summary:
+                text += "Earlier steps:\n" + "\n".join(summary) + "\n\n"
+            if details:
+                text += "Latest steps:\n" + json.dumps(details, default=str)
+            if estimate_tokens(text) <= budget:
+                return text
+
+        # Still too large: one line per step, newest first until the budget is used
+        limit = budget * CHARS_PER_TOKEN
+        lines = []
+        size = 0
+        for i in range(len(self.steps) - 1, -1, -1):
+            line = self._step_line(i + 1, self.steps[i])[:limit]
+            if size + len(line) > limit:
+                break
+            lines.insert(0, line)
+            size += len(line) + 1
+        return "\n".join(lines)
+
+    def render_all(self):
+        """All steps in as much detail as fits twice the loop budget, for the final analysis."""
+        return self.render(token_budget=self.token_budget * 2, recent_steps=len(self.steps))
+
+    def queries(self):
+        return [step["query"] for step in self.steps]
+
+
+def export_result(cursor, file_path, digest, max_rows=100000, batch_size=1000, compress=False):
+    """
+    Streams the cursor's result set in fetchmany batches straight into a CSV file
+    (gzip-compressed if compress) while feeding the digest, so memory use does not
+    depend on the result size. Stops after max_rows and marks the digest truncated.
+    The file is written as <file_path>.part and renamed when complete, so steps
+    collecting the output directory never pick up a half-written result.
+    """
+    opener = gzip.open if compress else open
+    part_path = file_path + ".part"
+    try:
+        with opener(part_path, mode="wt", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(digest.col_names)
+            while digest.row_count < max_rows:
+                check_cancelled()
+                rows = cursor.fetchmany(min(batch_size, max_rows - digest.row_count))
+                if not rows:
+                    break
+                writer.writerows(rows)
+                digest.add_rows(rows)
+            else:
+                if cursor.fetchone() is not None:
+                    digest.truncated = True
+                    try:
+                        cursor.cancel()
+                    except Exception:
+                        pass
+        os.replace(part_path, file_path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+    return digest
@@ -0,0 +1,189 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from agents.db_context import ResultDigest, export_result
+from db_pool import get_pool, execute_guarded
+from tracing import span, bind
+from pipeline import check_cancelled
+
+# Vetted, read-only DMV queries a DBA runs first, per issue category.
+DIAGNOSTIC_QUERIES = {
+    "blocking": [
+        ("blocking_chains", """
+            SELECT TOP 50 r.session_id, r.blocking_session_id, r.wait_type, r.wait_time, r.wait_resource,
+                r.status, r.command, DB_NAME(r.database_id) AS database_name, r.cpu_time, r.total_elapsed_time,
+                SUBSTRING(t.text, 1, 4000) AS sql_text
+            FROM sys.dm_exec_requests r
+            CROSS APPLY sys.dm_exec_sql_text(r.sql_handle) t
+            WHERE r.blocking_session_id <> 0
+               OR r.session_id IN (SELECT blocking_session_id FROM sys.dm_exec_requests WHERE blocking_session_id <> 0)
+            ORDER BY r.wait_time DESC
+        """),
+        ("lock_summary", """
+            SELECT TOP 50 request_session_id, resource_type, DB_NAME(resource_database_id) AS database_name,
+                request_mode, request_status, COUNT(*) AS lock_count
+            FROM sys.dm_tran_locks
+            GROUP BY request_session_id, resource_type, resource_database_id, request_mode, request_status
+            ORDER BY lock_count DESC
+        """),
+    ],
+    "deadlocks": [
+        ("recent_deadlocks", """
+            SELECT TOP 10 xed.value('@timestamp', 'datetime2') AS event_time, xed.query('.') AS deadlock_graph
+            FROM (
+                SELECT CAST(st.target_data AS XML) AS target_data
+                FROM sys.dm_xe_session_targets st
+                JOIN sys.dm_xe_sessions s ON s.address = st.event_session_address
+                WHERE s.name = 'system_health' AND st.target_name = 'ring_buffer'
+            ) AS data
+            CROSS APPLY target_data.nodes('RingBufferTarget/event[@name="xml_deadlock_report"]') AS xevents(xed)
+            ORDER BY event_time DESC
+        """),
+    ],
+    "long_running": [
+        ("active_requests", """
+            SELECT TOP 20 r.session_id, r.status, r.command, r.wait_type, r.cpu_time, r.total_elapsed_time,
+                r.logical_reads, DB_NAME(r.database_id) AS database_name, SUBSTRING(t.text, 1, 4000) AS sql_text
+            FROM sys.dm_exec_requests r
+            CROSS APPLY sys.dm_exec_sql_text(r.sql_handle) t
+            WHERE r.session_id <> @@SPID
+            ORDER BY r.total_elapsed_time DESC
+        """),
+        ("top_queries_by_elapsed_time", """
+            SELECT TOP 20 qs.execution_count,
+                qs.total_elapsed_time / qs.execution_count AS avg_elapsed_time,
+                qs.total_worker_time / qs.execution_count AS avg_cpu_time,
+                qs.total_logical_reads / qs.execution_count AS avg_logical_reads,
+                qs.last_execution_time, SUBSTRING(t.text, 1, 4000) AS sql_text
+            FROM sys.dm_exec_query_stats qs
+            CROSS APPLY sys.dm_exec_sql_text(qs.sql_handle) t
+            ORDER BY qs.total_elapsed_time DESC
+        """),
+    ],
+    "waits": [
+        ("top_waits", """
+            SELECT TOP 20 wait_type, waiting_tasks_count, wait_time_ms, max_wait_time_ms, signal_wait_time_ms
+            FROM sys.dm_os_wait_stats
+            WHERE wait_time_ms > 0 AND wait_type NOT IN (
+                'SLEEP_TASK', 'BROKER_TASK_STOP', 'BROKER_TO_FLUSH', 'BROKER_EVENTHANDLER', 'SQLTRACE_BUFFER_FLUSH',
+                'SQLTRACE_INCREMENTAL_FLUSH_SLEEP', 'CLR_AUTO_EVENT', 'CLR_MANUAL_EVENT', 'LAZYWRITER_SLEEP',
+                'CHECKPOINT_QUEUE', 'WAITFOR', 'XE_TIMER_EVENT', 'XE_DISPATCHER_WAIT', 'XE_LIVE_TARGET_TVF',
+                'FT_IFTS_SCHEDULER_IDLE_WAIT', 'LOGMGR_QUEUE', 'REQUEST_FOR_DEADLOCK_SEARCH', 'DIRTY_PAGE_POLL',
+                'HADR_FILESTREAM_IOMGR_IOCOMPLETION', 'SP_SERVER_DIAGNOSTICS_SLEEP', 'SLEEP_SYSTEMTASK',
+                'QDS_PERSIST_TASK_MAIN_LOOP_SLEEP', 'QDS_ASYNC_QUEUE', 'QDS_CLEANUP_STALE_QUERIES_TASK_MAIN_LOOP_SLEEP')
+            ORDER BY wait_time_ms DESC
+        """),
+    ],
+    "missing_indexes": [
+        ("missing_indexes", """
+            SELECT TOP 20 DB_NAME(mid.database_id) AS database_name, mid.statement AS table_name,
+                mid.equality_columns, mid.inequality_columns, mid.included_columns,
+                migs.user_seeks, migs.user_scans, migs.avg_total_user_cost, migs.avg_user_impact,
+                migs.avg_total_user_cost * migs.avg_user_impact * (migs.user_seeks + migs.user_scans) AS improvement_measure
+            FROM sys.dm_db_missing_index_group_stats migs
+            JOIN sys.dm_db_missing_index_groups mig ON migs.group_handle = mig.index_group_handle
+            JOIN sys.dm_db_missing_index_details mid ON mig.index_handle = mid.index_handle
+            ORDER BY improvement_measure DESC
+        """),
+    ],
+    "tempdb": [
+        ("tempdb_space", """
+            SELECT SUM(unallocated_extent_page_count) * 8 / 1024 AS free_mb,
+                SUM(user_object_reserved_page_count) * 8 / 1024 AS user_objects_mb,
+                SUM(internal_object_reserved_page_count) * 8 / 1024 AS internal_objects_mb,
+                SUM(version_store_reserved_page_count) * 8 / 1024 AS version_store_mb
+            FROM tempdb.sys.dm_db_file_space_usage
+        """),
+        ("tempdb_usage_by_session", """
+            SELECT TOP 20 session_id,
+                (user_objects_alloc_page_count - user_objects_dealloc_page_count) * 8 / 1024 AS user_objects_mb,
+                (internal_objects_alloc_page_count - internal_objects_dealloc_page_count) * 8 / 1024 AS internal_objects_mb
+            FROM sys.dm_db_session_space_usage
+            ORDER BY (user_objects_alloc_page_count + internal_objects_alloc_page_count) DESC
+        """),
+    ],
+    "file_growth": [
+        ("database_files", """
+            SELECT DB_NAME(mf.database_id) AS database_name, mf.name AS file_name, mf.type_desc,
+                mf.size * 8 / 1024 AS size_mb,
+                CASE WHEN mf.max_size = -1 THEN -1 ELSE mf.max_size * 8 / 1024 END AS max_size_mb,
+                mf.is_percent_growth, mf.growth, vfs.io_stall_read_ms, vfs.io_stall_write_ms
+            FROM sys.master_files mf
+            JOIN sys.dm_io_virtual_file_stats(NULL, NULL) vfs
+              ON mf.database_id = vfs.database_id AND mf.file_id = vfs.file_id
+            ORDER BY mf.size DESC
+        """),
+        ("log_space", "DBCC SQLPERF(LOGSPACE)"),
+    ],
+    "memory": [
+        ("system_memory", """
+            SELECT total_physical_memory_kb / 1024 AS total_physical_mb,
+                available_physical_memory_kb / 1024 AS available_physical_mb, system_memory_state_desc
+            FROM sys.dm_os_sys_memory
+        """),
+        ("memory_grants", """
+            SELECT TOP 20 session_id, requested_memory_kb, granted_memory_kb, used_memory_kb, wait_time_ms, queue_id
+            FROM sys.dm_exec_query_memory_grants
+            ORDER BY requested_memory_kb DESC
+        """),
+    ],
+}
+
+# Whole words only ("lock" must not match "block" or "clock"); stems list their inflections
+CATEGORY_KEYWORDS = {
+    "blocking": r"block(?:s|ed|ing|er)?|locks?|locked|locking|hang(?:s|ing)?|hung|stuck|timeouts?|timed out",
+    "deadlocks": r"deadlock(?:s|ed)?|victim|1205",
+    "long_running": r"slow(?:er|ness)?|long[- ]running|latency|timeouts?|timed out|performance|cpu",
+    "waits": r"waits?|waiting|waited|slow(?:er|ness)?|latency|performance|cpu|i/o|io",
+    "missing_indexes": r"index(?:es)?|indices|indexing|scans?|slow(?:er|ness)?|performance",
+    "tempdb": r"tempdb|spills?|temp table|version store",
+    "file_growth": r"disk|space|full|growth|autogrow(?:th)?|transaction log|log file|9002|1105",
+    "memory": r"memory|ram|grants?|resource_semaphore|701",
+}
+CATEGORY_PATTERNS = {category: re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE)
+                     for category, pattern in CATEGORY_KEYWORDS.items()}
+DEFAULT_CATEGORIES = ["blocking", "long_running", "waits"]
+
+
+def select_categories(log_summary, decision=None):
+    """Picks the diagnostic categories matching the log summary and the decision reason."""
+    text = f"{log_summary}\n{(decision or {}).get('reason', '')}"
+    categories = [category for category, pattern in CATEGORY_PATTERNS.items() if pattern.search(text)]
+    return categories or list(DEFAULT_CATEGORIES)
+
+
+def run_query(pool, name, sql, output_dir, max_rows, compress):
+    check_cancelled()
+    with span(f"sql.diagnostic.{name}", kind="sql", sql=sql[:2000]) as sql_span, pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            execute_guarded(cursor, sql, max_rows=max_rows)
+            if cursor.description is None:
+                return ResultDigest([]), None
+            extension = "csv.gz" if compress else "csv"
+            file_path = os.path.join(output_dir, f"diagnostic_{name}.{extension}")
+            digest = ResultDigest([desc[0] for desc in cursor.description])
+            export_result(cursor, file_path, digest, max_rows=max_rows, compress=compress)
+            sql_span.set(rows=digest.row_count, truncated=digest.truncated)
+            return digest, file_path
+        finally:
+            cursor.close()
+
+
+def run_diagnostics(conn_str, categories, output_dir, max_rows=10000, compress=False):
+    """
+    Runs the canned queries of the given categories concurrently over pooled connections.
+    Returns [(name, sql, digest, file_path, error)] in library order.
+    """
+    pool = get_pool(conn_str)
+    queries = [(name, " ".join(sql.split())) for category in categories for name, sql in DIAGNOSTIC_QUERIES[category]]
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = [executor.submit(bind(run_query), pool, name, sql, output_dir, max_rows, compress) for name, sql in queries]
+        results = []
+        for (name, sql), future in zip(queries, futures):
+            try:
+                digest, file_path = future.result()
+                results.append((name, sql, digest, file_path, None))
+            except Exception as e:
+                results.append((name, sql, None, None, str(e)))
+    return results
@@ -1,7 +1,9 @@
 from llm_client import chat_with_model
+from tracing import traced
 
 # client = OpenAI(api_key="your_api_key")  # Replace with your API key
 
+@traced("agent.decision", kind="agent")
 def decision_agent(log_summary):
     decision_prompt = f"""
     You are an orchestration decision-maker.
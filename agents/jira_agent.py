@@ -1,11 +1,28 @@
-from jira import JIRA
 from llm_client import chat_with_model
 import os
 import glob
-   
- 
- 
- 
+import hashlib
+import zipfile
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from tracing import span, traced, bind
+
+JIRA_UPLOAD_WORKERS = int(os.getenv("JIRA_UPLOAD_WORKERS", "4"))
+JIRA_ATTACHMENT_MAX_MB = float(os.getenv("JIRA_ATTACHMENT_MAX_MB", "10"))  # per file, as on most JIRA servers
+JIRA_ATTACHMENTS_TOTAL_MB = float(os.getenv("JIRA_ATTACHMENTS_TOTAL_MB", "50"))
+# Query result files are bundled into one archive instead of one upload each
+JIRA_BUNDLE_CSV = os.getenv("JIRA_BUNDLE_CSV", "true").lower() == "true"
+CSV_BUNDLE_NAME = "query_results.zip"
+
+
+@lru_cache(maxsize=8)
+def get_jira_client(server, username, password):
+    """JIRA clients are reused per server/credentials so a long-running process logs in once."""
+    from jira import JIRA
+    return JIRA(server=server, basic_auth=(username, password))
+
+
+@traced("agent.jira", kind="agent")
 def jira_agent(data):
     # Extract connection info and context
     server = data.get("server") or os.getenv("JIRA_SERVER")
@@ -37,13 +54,6 @@ def jira_agent(data):
     DB Result: {data.get('db_result')}
     """
 
-    generated_description = chat_with_model(prompt)
-
-    jira = JIRA(
-        server=server,
-        basic_auth=(username, password)
-    )
-
     # Sanitize summary: remove newlines and trim
     raw_summary = str(data.get('log_summary') or '').replace('\n', ' ').replace('\r', ' ').strip()[:255]
     # Use AI to rewrite summary, ask for <255 chars, no newlines, and do not cut words
@@ -55,7 +65,15 @@ def jira_agent(data):
     f"{raw_summary}"
 )
 
-    summary = chat_with_model(rewrite_prompt)
+    # The two LLM calls and the JIRA login are independent, run them concurrently
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        description_future = executor.submit(bind(chat_with_model), prompt)
+        summary_future = executor.submit(bind(chat_with_model), rewrite_prompt)
+        jira_future = executor.submit(bind(traced("jira.login", kind="jira")(get_jira_client)), server, username, password)
+        generated_description = description_future.result()
+        summary = summary_future.result()
+        jira = jira_future.result()
+
     summary = summary.replace('\n', ' ').replace('\r', ' ').strip()
 
     
@@ -76,17 +94,118 @@ def jira_agent(data):
         'customfield_16800': {'id': '18900'} 
     }
 
-    new_issue = jira.create_issue(fields=issue_dict)
+    with span("jira.create_issue", kind="jira"):
+        new_issue = jira.create_issue(fields=issue_dict)
     print(f"✅ Issue created: {new_issue.key}")
 
-    # Attach all files from the attachments list provided by orchestrator
+    # Attach all files from the attachments list provided by orchestrator; a callable is
+    # resolved only now, so files still being written while the ticket was drafted are included
     attachments = data.get('attachments', [])
+    if callable(attachments):
+        attachments = attachments()
     if attachments:
-        for file_path in attachments:
-            if os.path.isfile(file_path):
-                with open(file_path, 'rb') as f:
-                    jira.add_attachment(issue=new_issue, attachment=f, filename=os.path.basename(file_path))
-                print(f"📎 Attached: {os.path.basename(file_path)} to {new_issue.key}")
+        upload_attachments(jira, new_issue, attachments)
     else:
         print("⚠️ No files found in attachments to attach.")
-    return new_issue.key
\ No newline at end of file
+    return new_issue.key
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def bundle_csv_files(file_paths, max_bytes=None):
+    """
+    Replaces the query result files by a single zip next to them; returns the new file list.
+    A zip over max_bytes could not be attached: it is dropped and the files are kept as they are.
+    """
+    csv_files = [p for p in file_paths if p.endswith((".csv", ".csv.gz"))]
+    if len(csv_files) < 2:
+        return list(file_paths)
+    bundle_path = os.path.join(os.path.dirname(csv_files[0]), CSV_BUNDLE_NAME)
+    with zipfile.ZipFile(bundle_path, "w") as bundle:
+        for file_path in csv_files:
+            # Already gzipped results are stored as is, plain CSVs are deflated
+            compression = zipfile.ZIP_STORED if file_path.endswith(".gz") else zipfile.ZIP_DEFLATED
+            bundle.write(file_path, arcname=os.path.basename(file_path), compress_type=compression)
+    if max_bytes and os.path.getsize(bundle_path) > max_bytes:
+        print(f"⚠️ {CSV_BUNDLE_NAME} is over the attachment size limit, attaching the result files one by one")
+        os.remove(bundle_path)
+        return list(file_paths)
+    print(f"🗜️ Bundled {len(csv_files)} result files into {CSV_BUNDLE_NAME}")
+    return [p for p in file_paths if p not in csv_files] + [bundle_path]
+
+
+@traced("jira.attachments", kind="jira")
+def upload_attachments(jira, issue, file_paths, max_workers=JIRA_UPLOAD_WORKERS, bundle_csv=JIRA_BUNDLE_CSV,
+                       max_file_mb=JIRA_ATTACHMENT_MAX_MB, max_total_mb=JIRA_ATTACHMENTS_TOTAL_MB):
+    """
+    Uploads files to an issue concurrently. Files with the same content as another upload are
+    skipped, as are files over the per-file size limit and whatever no longer fits in the total
+    budget (smallest files go first).
+    Returns the names of the attached files.
+    """
+    file_paths = [p for p in file_paths if os.path.isfile(p)]
+    if bundle_csv:
+        file_paths = bundle_csv_files(file_paths, max_bytes=max_file_mb * 1024 * 1024)
+
+    sizes = {p: os.path.getsize(p) for p in file_paths}
+    known_hashes = set()
+    uploads = []
+    total_bytes = 0
+    for file_path in sorted(file_paths, key=sizes.get):
+        name = os.path.basename(file_path)
+        if sizes[file_path] > max_file_mb * 1024 * 1024:
+            print(f"⚠️ Skipping {name}: {sizes[file_path] / 1024 / 1024:.1f} MB is over the {max_file_mb} MB limit")
+            continue
+        if total_bytes + sizes[file_path] > max_total_mb * 1024 * 1024:
+            print(f"⚠️ Skipping {name}: attachments would exceed {max_total_mb} MB in total")
+            continue
+        content_hash = file_sha256(file_path)
+        if content_hash in known_hashes:
+            print(f"♻️ Skipping {name}: same content as another attachment")
+            continue
+        known_hashes.add(content_hash)
+        total_bytes += sizes[file_path]
+        uploads.append(file_path)
+
+    def upload(file_path):
+        with span("jira.upload", kind="jira", file=os.path.basename(file_path), bytes=sizes[file_path]), \
+                open(file_path, 'rb') as f:
+            jira.add_attachment(issue=issue, attachment=f, filename=os.path.basename(file_path))
+        print(f"📎 Attached: {os.path.basename(file_path)} to {issue.key}")
+        return os.path.basename(file_path)
+
+    attached = []
+    if uploads:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(uploads)))) as executor:
+            futures = {executor.submit(bind(upload), p): p for p in uploads}
+            for future, file_path in futures.items():
+                try:
+                    attached.append(future.result())
+                except Exception as e:
+                    print(f"❌ Failed to attach {os.path.basename(file_path)}: {e}")
+    return attached
+
+def jira_add_occurrence(data):
+    """
+    Records a repeat of a known incident on its existing issue instead of creating a new one.
+    data: server/username/password (as in jira_agent), issue_key, occurrences, details (str).
+    """
+    server = data.get("server") or os.getenv("JIRA_SERVER")
+    username = data.get("username") or os.getenv("EMAIL")
+    password = data.get("password") or os.getenv("API_TOKEN")
+    jira = get_jira_client(server, username, password)
+
+    comment = (
+        f"The same incident occurred again (occurrence #{data.get('occurrences')}).\n\n"
+        f"{data.get('details') or ''}"
+    )
+    with span("jira.add_comment", kind="jira", issue_key=data["issue_key"]):
+        jira.add_comment(data["issue_key"], comment[:30000])
+    print(f"🔁 Added occurrence #{data.get('occurrences')} to {data['issue_key']}")
+    return data["issue_key"]
@@ -1,7 +1,35 @@
 from llm_client import chat_with_model
+from log_triage import LogTriage
+from tracing import traced
 
+
+def summarize_triage(triage):
+    prompt = (
+        "The following error/warning templates were extracted from a system log. "
+        "Variable values are masked (<NUM>, <TS>, <GUID>, ...), each template shows how many "
+        "times it occurred and a few raw samples. Summarize the errors, most significant first, "
+        "and mention their occurrence counts:\n\n"
+        f"{triage.render()}"
+    )
+    # Stream the final summary to the console as it is generated
+    summary = chat_with_model(prompt, stream=True, on_token=lambda token: print(token, end="", flush=True))
+    print()
+    return summary
+
+
+@traced("agent.log", kind="agent")
 def log_agent(input_text):
+    """
+    Summarizes errors in a log.
+    input_text is one of:
+      - a LogTriage (see log_triage.triage_log_file): only templates, counts and samples
+        are sent to the LLM, in a single call.
+      - the full log as a string.
+    """
     print("🤖 Log Agent: Analyzing logs...\n")
+    if isinstance(input_text, LogTriage):
+        if not input_text.clusters:
+            return "No errors or warnings found in the log."
+        return summarize_triage(input_text)
     prompt = f"Analyze the following system log and summarize any error:\n\n{input_text}"
-    result = chat_with_model(prompt)
-    return result
+    return chat_with_model(prompt)
@@ -0,0 +1,145 @@
+import os
+import glob
+import json
+import uuid
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from log_triage import LogTriage, triage_log_file
+from incident_index import triage_signature, fingerprint
+from report import WRITERS, REPORT_FORMAT, REPORT_EXTENSIONS, section_text
+
+BATCH_TRIAGE_WORKERS = int(os.getenv("BATCH_TRIAGE_WORKERS", str(os.cpu_count() or 1)))
+# Each pipeline mostly waits on the LLM, the shared client caps the concurrent calls
+BATCH_PIPELINE_WORKERS = int(os.getenv("BATCH_PIPELINE_WORKERS", "2"))
+
+
+def expand_inputs(spec):
+    """A directory (all files below it) or a glob pattern (** allowed) -> sorted list of files."""
+    if os.path.isdir(spec):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(spec) for name in names]
+    else:
+        paths = glob.glob(spec, recursive=True)
+    return sorted(p for p in paths if os.path.isfile(p))
+
+
+def triage_file(file_path):
+    # Top-level so it can run in a worker process; errors are returned, not raised, to keep the batch going
+    try:
+        return file_path, triage_log_file(file_path), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+def triage_files(file_paths, workers=BATCH_TRIAGE_WORKERS):
+    """Triage is CPU-bound regex work: files are spread over processes. Yields (path, triage, error)."""
+    if workers <= 1 or len(file_paths) <= 1:
+        yield from map(triage_file, file_paths)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(file_paths))) as executor:
+        # Big files first so a large log does not start last and become the tail
+        by_size = sorted(file_paths, key=lambda p: os.path.getsize(p) if os.path.isfile(p) else 0, reverse=True)
+        yield from executor.map(triage_file, by_size)
+
+
+def group_incidents(triaged):
+    """Groups triaged files by error signature; each group becomes one incident with a merged triage."""
+    groups = {}
+    for file_path, triage in triaged:
+        signature = triage_signature(triage)
+        incident = groups.setdefault(fingerprint(signature), {
+            "fingerprint": fingerprint(signature), "signature": signature, "files": [],
+            "triage": LogTriage(max_templates=triage.max_templates,
+                                samples_per_template=triage.samples_per_template),
+        })
+        incident["files"].append(file_path)
+        incident["triage"].merge(triage)
+    # Most events first: the worst incidents are analyzed first
+    return sorted(groups.values(), key=lambda incident: -incident["triage"].event_count)
+
+
+def analyze_incident(incident):
+    from orchestrator import orchestrator
+    print(f"🔍 Incident {incident['fingerprint'][:12]}: {len(incident['files'])} file(s), "
+          f"{incident['triage'].event_count} events")
+    try:
+        incident["result"] = orchestrator(incident["triage"])
+        incident["error"] = None
+    except Exception as e:
+        print(f"❌ Incident {incident['fingerprint'][:12]} failed: {e}")
+        incident["result"] = None
+        incident["error"] = str(e)
+    return incident
+
+
+def write_batch_report(output_dir, incidents, failed_files, clean_files, report_format=REPORT_FORMAT):
+    """One consolidated report for the batch plus a JSON summary; returns the report path."""
+    summary = []
+    sections = [("📦 Batch Summary", "\n".join([
+        f"Incidents: {len(incidents)}",
+        f"Files with errors: {sum(len(i['files']) for i in incidents)}",
+        f"Files without errors: {len(clean_files)}",
+        f"Files that could not be read: {len(failed_files)}",
+    ]), True)]
+    for number, incident in enumerate(incidents, 1):
+        result = incident.get("result") or {}
+        entry = {
+            "fingerprint": incident["fingerprint"],
+            "files": incident["files"],
+            "events": incident["triage"].event_count,
+            "templates": len(incident["triage"].clusters),
+            "jira_ticket": result.get("jira_ticket"),
+            "duplicate_of": result.get("duplicate_of"),
+            "report_path": result.get("report_path"),
+            "error": incident.get("error"),
+        }
+        summary.append(entry)
+        details = {key: value for key, value in entry.items() if value}
+        details["decision"] = result.get("decision")
+        sections.append((f"🧩 Incident {number}: {incident['fingerprint'][:12]}",
+                         *section_text(details)))
+        sections.append((f"📌 Incident {number} Log Summary",
+                         *section_text(result.get("log_summary") or incident["triage"].render(max_templates=10))))
+    if failed_files:
+        sections.append(("⚠️ Unreadable Files", "\n".join(f"{path}: {error}" for path, error in failed_files), True))
+
+    with open(os.path.join(output_dir, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump({"incidents": summary, "clean_files": clean_files,
+                   "failed_files": [{"path": p, "error": e} for p, e in failed_files]}, f, indent=2, default=str)
+    report_path = os.path.join(output_dir, f"batch_report.{REPORT_EXTENSIONS[report_format]}")
+    WRITERS[report_format](report_path, sections, title="Batch Analysis Report")
+    return report_path
+
+
+def run_batch(spec, triage_workers=BATCH_TRIAGE_WORKERS, pipeline_workers=BATCH_PIPELINE_WORKERS):
+    """
+    Analyzes every log matched by spec: files are triaged in parallel processes, files
+    sharing an error signature are analyzed once as a single incident, and the incidents
+    run through the orchestrator concurrently. Returns the batch summary.
+    """
+    file_paths = expand_inputs(spec)
+    if not file_paths:
+        raise FileNotFoundError(f"No log files match: {spec}")
+    print(f"📂 Batch: triaging {len(file_paths)} file(s) with {triage_workers} worker(s)...")
+
+    triaged, clean_files, failed_files = [], [], []
+    for file_path, triage, error in triage_files(file_paths, triage_workers):
+        if error:
+            failed_files.append((file_path, error))
+        elif triage.clusters:
+            triaged.append((file_path, triage))
+        else:
+            clean_files.append(file_path)
+
+    incidents = group_incidents(triaged)
+    print(f"🧹 Batch: {len(triaged)} file(s) with errors -> {len(incidents)} distinct incident(s)\n")
+    with ThreadPoolExecutor(max_workers=max(1, pipeline_workers)) as executor:
+        incidents = list(executor.map(analyze_incident, incidents))
+
+    output_dir = os.path.join("output", "batch_{timestamp}_{run_id}".format(
+        timestamp=datetime.now().strftime("%Y%m%d_%H%M%S"), run_id=uuid.uuid4().hex[:6]))
+    os.makedirs(output_dir, exist_ok=True)
+    report_path = write_batch_report(output_dir, incidents, failed_files, clean_files)
+    print(f"📄 Batch report: {report_path}")
+    return {"report_path": report_path, "incidents": len(incidents), "files": len(file_paths),
+            "failed_files": len(failed_files), "clean_files": len(clean_files)}
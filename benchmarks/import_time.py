@@ -0,0 +1,88 @@
+"""
+Import-time benchmark for the CLI entry points.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters, reports the
+median cumulative import time and the heaviest dependencies, and exits with status 1
+when a module exceeds its budget or eagerly imports one of the heavy modules that
+must stay lazy (see import_budget.json).
+
+Usage:
+    python benchmarks/import_time.py [--runs 5] [--top 10] [--update-budget]
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_budget.json")
+LINE_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module):
+    """Returns {imported module: (self_us, cumulative_us, depth)} for one fresh import."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    timings = {}
+    for line in completed.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--update-budget", action="store_true",
+                        help="set each budget to 2x the measured median")
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    failures = []
+    for module, budget_ms in config["budgets_ms"].items():
+        runs = [measure(module) for _ in range(args.runs)]
+        median_ms = statistics.median(run[module][1] for run in runs) / 1000
+        status = "OK" if median_ms <= budget_ms else "OVER BUDGET"
+        print(f"\n⏱️ import {module}: {median_ms:.1f} ms (budget {budget_ms} ms) {status}")
+
+        # Heaviest direct dependencies of the last run, by cumulative time
+        last = runs[-1]
+        heaviest = sorted(((cum, name) for name, (_, cum, depth) in last.items() if depth == 1), reverse=True)
+        for cumulative_us, name in heaviest[:args.top]:
+            print(f"   {cumulative_us / 1000:8.1f} ms  {name}")
+
+        eager = sorted({name.split(".")[0] for name in last} & set(config["lazy_modules"]))
+        if eager:
+            print(f"   ❌ heavy modules imported eagerly: {', '.join(eager)}")
+            failures.append(f"{module} imports {', '.join(eager)}")
+        if median_ms > budget_ms:
+            failures.append(f"{module} took {median_ms:.1f} ms > {budget_ms} ms")
+        if args.update_budget:
+            config["budgets_ms"][module] = int(median_ms * 2) + 1
+
+    if args.update_budget:
+        with open(BUDGET_PATH, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+            f.write("\n")
+        print(f"\n📝 Budgets updated in {BUDGET_PATH}")
+
+    if failures:
+        print("\n❌ Import-time regressions:\n   " + "\n   ".join(failures))
+        sys.exit(1)
+    print("\n✅ Import times within budget.")
+
+
+if __name__ == "__main__":
+    main()
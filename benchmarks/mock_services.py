@@ -0,0 +1,247 @@
+"""
+Local stand-ins for the external services of the pipeline, for benchmarks only:
+- MockLLMServer: OpenAI-compatible chat completions endpoint (plain and SSE streaming)
+  with configurable latency, canned responses per prompt kind and call counters.
+- A fake `pyodbc` module backed by in-memory SQLite. SET statements are dropped and
+  SQL Server-only queries (DMVs, TOP, CROSS APPLY...) return a synthetic result set,
+  so the diagnostic and result-export paths run at realistic sizes.
+- A fake `jira` module whose client records issues, comments and attachments.
+
+install_fakes() registers the fake modules in sys.modules; it must run before the
+pipeline modules import them.
+"""
+import re
+import sys
+import json
+import time
+import types
+import sqlite3
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DECISION_RESPONSE = json.dumps({"run_code_agent": True, "run_db_agent": True,
+                                "reason": "Timeouts and deadlocks on the database under load"})
+SQL_RESPONSE = "SELECT TOP 100 session_id, wait_type, wait_time FROM sys.dm_exec_requests ORDER BY wait_time DESC"
+DEFAULT_RESPONSE = (
+    "Summary: repeated SqlException timeouts and deadlock victims in OrderService.SaveOrder "
+    "while the nightly import holds locks on dbo.Orders. Root cause: long transaction without "
+    "an index on Orders.CustomerId. Suggested fix: add the index and batch the import."
+)
+# First matching pattern wins: (name, regex on the prompt, response)
+CANNED_RESPONSES = [
+    ("decision", re.compile(r"Decide which agents should be executed"), DECISION_RESPONSE),
+    ("db_next_query", re.compile(r"Suggest ONE next diagnostic query"), SQL_RESPONSE),
+    ("jira_summary", re.compile(r"concise Jira ticket summary"), "Database timeouts and deadlocks in order import"),
+]
+
+
+class MockLLMServer:
+    """OpenAI-compatible chat server on a background thread. Counts calls and tokens per prompt kind."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, tokens_per_second=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.calls = {}
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                prompt = "".join(m.get("content", "") for m in payload.get("messages", []))
+                kind, response = server.respond(prompt)
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(response) // 4}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                time.sleep(server.latency)
+                if payload.get("stream"):
+                    self._stream(response, usage)
+                else:
+                    self._send_json({"choices": [{"message": {"role": "assistant", "content": response}}],
+                                     "usage": usage})
+
+            def _send_json(self, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, response, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                words = response.split(" ")
+                for i, word in enumerate(words):
+                    token = word if i == 0 else " " + word
+                    chunk = {"choices": [{"delta": {"content": token}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    if server.tokens_per_second:
+                        time.sleep(1 / server.tokens_per_second)
+                self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.httpd.server_address[1]}/v1/chat/completions"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def respond(self, prompt):
+        kind, response = "default", DEFAULT_RESPONSE
+        for name, pattern, canned in CANNED_RESPONSES:
+            if pattern.search(prompt):
+                kind, response = name, canned
+                break
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            self.prompt_chars += len(prompt)
+        return kind, response
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# --- fake pyodbc ------------------------------------------------------------
+
+SET_PREFIX = re.compile(r"^\s*SET\s+[^;\n]*;?\s*", re.IGNORECASE)
+SYNTHETIC_COLUMNS = ["session_id", "wait_type", "wait_time", "database_name", "sql_text"]
+
+
+class FakeODBCError(Exception):
+    pass
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection._db.cursor()
+        self._synthetic = None
+        self.description = None
+
+    def execute(self, sql, *params):
+        while SET_PREFIX.match(sql):
+            sql = SET_PREFIX.sub("", sql, count=1)
+        self._synthetic = None
+        if not sql.strip():
+            self.description = None
+            return self
+        try:
+            self._cursor.execute(sql, params)
+            self.description = self._cursor.description
+        except sqlite3.Error:
+            # SQL Server syntax: answer with a synthetic result set of the configured size
+            rows = self._connection.synthetic_rows
+            self._synthetic = iter((i, "LCK_M_X" if i % 3 else "PAGEIOLATCH_SH", i * 7 % 5000, "Orders",
+                                    f"UPDATE dbo.Orders SET Status = @p0 WHERE OrderId = {i}") for i in range(rows))
+            self.description = [(name, None, None, None, None, None, True) for name in SYNTHETIC_COLUMNS]
+        return self
+
+    def fetchmany(self, size=1):
+        if self._synthetic is not None:
+            return [row for _, row in zip(range(size), self._synthetic)]
+        return self._cursor.fetchmany(size)
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchall(self):
+        if self._synthetic is not None:
+            return list(self._synthetic)
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class FakeConnection:
+    def __init__(self, synthetic_rows):
+        self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.synthetic_rows = synthetic_rows
+        self.timeout = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self._db.close()
+
+
+def make_fake_pyodbc(synthetic_rows=1000, connect_latency=0.0):
+    module = types.ModuleType("pyodbc")
+    module.Error = FakeODBCError
+    module.connections = 0
+
+    def connect(conn_str, autocommit=False, timeout=0):
+        time.sleep(connect_latency)
+        module.connections += 1
+        return FakeConnection(synthetic_rows)
+
+    module.connect = connect
+    return module
+
+
+# --- fake jira --------------------------------------------------------------
+
+class FakeIssue:
+    def __init__(self, key, fields):
+        self.key = key
+        self.raw_fields = fields
+        self.fields = types.SimpleNamespace(attachment=[])
+
+
+class FakeJIRA:
+    """Records calls instead of talking to a server; each call sleeps for `latency` seconds."""
+    latency = 0.05
+    issues = {}
+    comments = []
+    uploaded_bytes = 0
+    _lock = threading.Lock()
+
+    def __init__(self, server=None, basic_auth=None, **kwargs):
+        time.sleep(self.latency)
+
+    def create_issue(self, fields):
+        time.sleep(self.latency)
+        with self._lock:
+            issue = FakeIssue(f"BENCH-{len(self.issues) + 1}", fields)
+            FakeJIRA.issues[issue.key] = issue
+        return issue
+
+    def add_attachment(self, issue, attachment, filename=None):
+        data = attachment.read()
+        time.sleep(self.latency)
+        with self._lock:
+            FakeJIRA.uploaded_bytes += len(data)
+            issue.fields.attachment.append(types.SimpleNamespace(filename=filename, size=len(data),
+                                                                 get=lambda data=data: data))
+
+    def add_comment(self, issue, body):
+        time.sleep(self.latency)
+        with self._lock:
+            FakeJIRA.comments.append((getattr(issue, "key", issue), body))
+
+
+def make_fake_jira(latency=0.05):
+    module = types.ModuleType("jira")
+    FakeJIRA.latency = latency
+    module.JIRA = FakeJIRA
+    return module
+
+
+def install_fakes(synthetic_rows=1000, jira_latency=0.05, db_connect_latency=0.0):
+    sys.modules["pyodbc"] = make_fake_pyodbc(synthetic_rows, db_connect_latency)
+    sys.modules["jira"] = make_fake_jira(jira_latency)
@@ -0,0 +1,161 @@
+"""
+End-to-end benchmark of the analysis pipeline, fully offline.
+
+Runs triage + orchestrator() on synthetic logs of increasing size against a local mock
+LLM server, a fake pyodbc backed by SQLite and a fake JIRA (see mock_services.py).
+Each size runs in a fresh interpreter so peak memory is per run. Reports end-to-end
+and per-stage latency, peak RSS and LLM call/token counts, and writes them as JSON.
+
+Usage:
+    python benchmarks/pipeline_bench.py [--sizes-mb 1,10,100] [--llm-latency 0.05]
+        [--jira-latency 0.05] [--db-rows 1000] [--workdir .cache/bench] [--output results.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, BENCH_DIR]
+
+from mock_services import MockLLMServer, install_fakes  # noqa: E402
+from synthetic_logs import ensure_log  # noqa: E402
+
+RESULT_FILE = "bench_result.json"
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_child(log_path, db_rows, jira_latency):
+    """Runs one analysis in this process (fakes installed first) and writes RESULT_FILE to the cwd."""
+    install_fakes(synthetic_rows=db_rows, jira_latency=jira_latency)
+    from log_triage import triage_log_file
+    from orchestrator import orchestrator
+    from mock_services import FakeJIRA
+
+    started = time.perf_counter()
+    triage = triage_log_file(log_path)
+    triage_seconds = time.perf_counter() - started
+    result = orchestrator(triage)
+    total_seconds = time.perf_counter() - started
+
+    with open(result["trace_path"], "r", encoding="utf-8") as f:
+        trace = json.load(f)
+    llm_spans = [s for s in trace["spans"] if s["kind"] == "llm"]
+    summary = {
+        "log_bytes": os.path.getsize(log_path),
+        "log_lines": triage.total_lines,
+        "templates": len(triage.clusters),
+        "triage_seconds": round(triage_seconds, 3),
+        "pipeline_seconds": round(total_seconds - triage_seconds, 3),
+        "total_seconds": round(total_seconds, 3),
+        "steps": {name: timing["seconds"] for name, timing in result["timings"].items()},
+        "step_status": {name: timing["status"] for name, timing in result["timings"].items()},
+        "spans": trace["summary"],
+        "llm_calls": len(llm_spans),
+        "llm_cache_hits": sum(1 for s in llm_spans if s["attributes"].get("cache_hit")),
+        "prompt_tokens": sum(s["attributes"].get("prompt_tokens", 0) for s in llm_spans),
+        "completion_tokens": sum(s["attributes"].get("completion_tokens", 0) for s in llm_spans),
+        "jira_uploaded_bytes": FakeJIRA.uploaded_bytes,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    with open(RESULT_FILE, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+
+def bench_env(workdir, llm_url):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join([ROOT, env.get("PYTHONPATH", "")]).rstrip(os.pathsep),
+        "LLM_API_URL": llm_url,
+        "LLM_API_TOKEN": "bench",
+        "LLM_CACHE_DISABLED": "true",
+        "JIRA_DEDUP": "false",
+        "JIRA_SERVER": "http://jira.invalid",
+        "DB_CONN_STR": "DRIVER={Fake};SERVER=bench",
+        "PROJECT_PATH": ROOT,
+        "CODE_INDEX_DIR": os.path.join(workdir, "cache"),
+        "INCIDENT_INDEX_PATH": os.path.join(workdir, "cache", "incidents.sqlite"),
+        "EMBEDDING_PROVIDER": "hash",
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "cache", "embeddings.sqlite"),
+    })
+    return env
+
+
+def run_size(size_mb, args, server):
+    log_path = ensure_log(os.path.join(args.workdir, "logs"), size_mb)
+    run_dir = os.path.join(args.workdir, f"run_{size_mb:g}mb")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+    server.calls.clear()
+
+    print(f"⏱️ Running pipeline on {size_mb:g} MB log...")
+    with open(os.path.join(run_dir, "stdout.log"), "w", encoding="utf-8") as out:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", log_path,
+             "--db-rows", str(args.db_rows), "--jira-latency", str(args.jira_latency)],
+            cwd=run_dir, env=bench_env(os.path.abspath(args.workdir), server.url),
+            stdout=out, stderr=subprocess.STDOUT,
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark run failed, see {os.path.join(run_dir, 'stdout.log')}")
+    with open(os.path.join(run_dir, RESULT_FILE), "r", encoding="utf-8") as f:
+        result = json.load(f)
+    result["size_mb"] = size_mb
+    result["llm_calls_by_kind"] = dict(server.calls)
+    return result
+
+
+def print_results(results):
+    print(f"\n{'size MB':>8} {'lines':>11} {'triage s':>9} {'pipeline s':>11} {'total s':>8} "
+          f"{'peak MB':>8} {'LLM calls':>9} {'tokens':>8}")
+    for r in results:
+        print(f"{r['size_mb']:>8g} {r['log_lines']:>11} {r['triage_seconds']:>9.2f} {r['pipeline_seconds']:>11.2f} "
+              f"{r['total_seconds']:>8.2f} {r['peak_rss_mb'] or '-':>8} {r['llm_calls']:>9} "
+              f"{r['prompt_tokens'] + r['completion_tokens']:>8}")
+    for r in results:
+        steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in r["steps"].items())
+        print(f"   {r['size_mb']:g} MB steps: {steps}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", default="1,10,100", help="comma-separated log sizes in MB")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per mock LLM call")
+    parser.add_argument("--jira-latency", type=float, default=0.05, help="seconds per fake JIRA call")
+    parser.add_argument("--db-rows", type=int, default=1000, help="rows returned by each fake SQL Server query")
+    parser.add_argument("--workdir", default=os.path.join(ROOT, ".cache", "bench"))
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--child", metavar="LOG_PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.db_rows, args.jira_latency)
+        return
+
+    server = MockLLMServer(latency=args.llm_latency).start()
+    try:
+        results = [run_size(float(size), args, server) for size in args.sizes_mb.split(",")]
+    finally:
+        server.stop()
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📝 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
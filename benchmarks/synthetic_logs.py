@@ -0,0 +1,96 @@
+"""
+Synthetic application logs for benchmarks: mostly INFO noise with a realistic mix of
+WARN/ERROR lines, stack traces and variable tokens (ids, GUIDs, durations, IPs), so the
+triage clusters a few dozen templates out of any log size.
+
+Usage:
+    python benchmarks/synthetic_logs.py <output_path> <size_mb> [--seed 1]
+"""
+import os
+import random
+import argparse
+from datetime import datetime, timedelta
+
+INFO_MESSAGES = [
+    "Request {req} GET /api/orders/{n} completed in {ms} ms",
+    "User {n} logged in from {ip}",
+    "Cache refresh for tenant {n} finished, {n2} entries",
+    "Scheduled job ImportOrders batch {n} processed {n2} rows",
+    "Health check OK ({ms} ms)",
+]
+WARN_MESSAGES = [
+    "Slow query detected on dbo.Orders: {ms} ms (session {n})",
+    "Retrying HTTP call to payment-gateway ({ip}), attempt {small}",
+    "Connection pool usage at {pct}% for OrdersDb",
+]
+ERROR_MESSAGES = [
+    "SqlException: Execution Timeout Expired. The timeout period elapsed prior to completion "
+    "(session {n}, query {guid})",
+    "SqlException (1205): Transaction (Process ID {n}) was deadlocked on lock resources with another "
+    "process and has been chosen as the deadlock victim.",
+    "NullReferenceException in OrderService.SaveOrder for order {n}",
+    "Failed to publish event {guid} to queue orders-events: broker {ip} unreachable",
+    "OutOfMemoryException while building report {n} ({n2} rows)",
+]
+STACK_TRACE = [
+    "   at OrderService.SaveOrder(Order order) in C:\\src\\OrderService.cs:line {small}",
+    "   at ImportJob.Run(Batch batch) in C:\\src\\ImportJob.cs:line {small}",
+    "   at System.Threading.Tasks.Task.Execute()",
+]
+
+
+def render(template, rng):
+    return template.format(
+        req=f"{rng.getrandbits(32):08x}", n=rng.randint(1, 10 ** 6), n2=rng.randint(1, 10 ** 5),
+        ms=rng.randint(1, 60000), ip=f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        small=rng.randint(1, 500), pct=rng.randint(50, 100), guid=f"{rng.getrandbits(128):032x}",
+    )
+
+
+def generate_log(output_path, size_mb, seed=1, error_ratio=0.04, warn_ratio=0.06):
+    """Writes about size_mb megabytes of log lines to output_path; returns the number of bytes written."""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    moment = datetime(2024, 1, 1)
+    with open(output_path, "w", encoding="utf-8", newline="\n") as f:
+        while written < target:
+            block = []
+            for _ in range(2000):
+                moment += timedelta(milliseconds=rng.randint(1, 500))
+                timestamp = moment.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+                roll = rng.random()
+                if roll < error_ratio:
+                    block.append(f"{timestamp} ERROR [{rng.randint(1, 64)}] {render(rng.choice(ERROR_MESSAGES), rng)}")
+                    if rng.random() < 0.5:
+                        block.extend(render(line, rng) for line in STACK_TRACE)
+                elif roll < error_ratio + warn_ratio:
+                    block.append(f"{timestamp} WARN [{rng.randint(1, 64)}] {render(rng.choice(WARN_MESSAGES), rng)}")
+                else:
+                    block.append(f"{timestamp} INFO [{rng.randint(1, 64)}] {render(rng.choice(INFO_MESSAGES), rng)}")
+            data = "\n".join(block) + "\n"
+            f.write(data)
+            written += len(data)
+    return written
+
+
+def ensure_log(directory, size_mb, seed=1):
+    """Returns the path of a synthetic log of the given size, generating it once."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"synthetic_{size_mb:g}mb_seed{seed}.log")
+    if not os.path.isfile(path):
+        print(f"📝 Generating {size_mb:g} MB synthetic log: {path}")
+        # Renamed when complete, so an interrupted run does not leave a short log behind
+        generate_log(path + ".tmp", size_mb, seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_path")
+    parser.add_argument("size_mb", type=float)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    size = generate_log(args.output_path, args.size_mb, args.seed)
+    print(f"✅ Wrote {size / 1024 / 1024:.1f} MB to {args.output_path}")
@@ -0,0 +1,329 @@
+import os
+import re
+import ast
+import math
+import sqlite3
+import time
+import hashlib
+
+SOURCE_EXTENSIONS = (".py", ".cs", ".js", ".ts")
+SKIP_DIRS = {".git", ".hg", ".svn", "node_modules", "bin", "obj", "dist", "build",
+             "__pycache__", ".venv", "venv", ".cache", "output"}
+CODE_INDEX_DIR = os.getenv("CODE_INDEX_DIR", ".cache")
+
+MAX_FILE_KB = 200
+# Bumped when chunking or the schema changes, so existing indexes are rebuilt once
+CHUNKER_VERSION = "3"
+# Seconds update() waits for another process or thread building the same index
+CODE_INDEX_LOCK_TIMEOUT = float(os.getenv("CODE_INDEX_LOCK_TIMEOUT", "600"))
+# Values per "IN (...)" query, under SQLite's bound-parameter limit
+QUERY_BATCH = 500
+MAX_CHUNK_LINES = 150
+WINDOW_LINES = 80
+
+# Declarations in C#, JS and TS files, used to split them into chunks.
+DECLARATION_PATTERN = re.compile(
+    r"^\s*(?:(?:public|private|protected|internal|static|async|export|default|abstract|override|"
+    r"virtual|sealed|partial|readonly)\s+)*"
+    r"(?:class|interface|struct|enum|function|"
+    r"(?!(?:if|else|for|foreach|while|switch|catch|using|lock|return|new|await|throw)\b)[\w<>\[\],]+\s+\w+\s*\([^;]*$|"
+    r"\w+\s*=\s*(?:async\s*)?\(.*\)\s*=>)",
+)
+DECLARATION_NAME_PATTERN = re.compile(r"(?:class|interface|struct|enum|function)\s+(\w+)|(\w+)\s*(?:=\s*(?:async\s*)?)?\(")
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]{3,}")
+CAMEL_PARTS_PATTERN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+SOURCE_FILE_PATTERN = re.compile(r"[\w\-.]+\.(?:py|cs|js|ts)\b")
+STOPWORDS = {
+    "error", "errors", "exception", "failed", "failure", "warning", "the", "this", "that", "with",
+    "from", "when", "while", "there", "which", "were", "have", "been", "into", "line", "file",
+    "true", "false", "none", "null", "return", "self", "summary", "issue", "occurred", "log", "logs",
+}
+
+
+def identifier_terms(text):
+    """Lowercased identifiers in text plus their snake_case/camelCase parts."""
+    terms = set()
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        terms.add(identifier.lower())
+        for part in re.split(r"_+", identifier):
+            for sub in CAMEL_PARTS_PATTERN.findall(part):
+                if len(sub) >= 4:
+                    terms.add(sub.lower())
+    return terms - STOPWORDS
+
+
+def chunk_python(text):
+    """
+    Splits a Python file into top-level functions/classes (large classes into methods),
+    plus "<module>" chunks with the remaining lines: imports, constants and module-level code.
+    """
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+    lines = text.splitlines()
+    chunks = []
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        end = node.end_lineno
+        if isinstance(node, ast.ClassDef) and end - start > MAX_CHUNK_LINES:
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    chunks.append((f"{node.name}.{child.name}", child.lineno, child.end_lineno))
+        else:
+            chunks.append((node.name, start, end))
+    if not chunks:
+        return None
+    covered = set()
+    for _, start, end in chunks:
+        covered.update(range(start, end + 1))
+    remainder = [number for number in range(1, len(lines) + 1)
+                 if number not in covered and lines[number - 1].strip()]
+    result = [(name, start, end, "\n".join(lines[start - 1:end])) for name, start, end in chunks]
+    for i in range(0, len(remainder), MAX_CHUNK_LINES):
+        numbers = remainder[i:i + MAX_CHUNK_LINES]
+        result.append(("<module>", numbers[0], numbers[-1], "\n".join(lines[n - 1] for n in numbers)))
+    return result
+
+
+def chunk_by_declarations(text):
+    """Splits brace-language files at declaration lines, capping chunk length."""
+    lines = text.splitlines()
+    starts = [i for i, line in enumerate(lines) if DECLARATION_PATTERN.match(line)]
+    if not starts:
+        return None
+    chunks = []
+    bounds = starts + [len(lines)]
+    for begin, end in zip(bounds, bounds[1:]):
+        match = DECLARATION_NAME_PATTERN.search(lines[begin])
+        name = (match.group(1) or match.group(2)) if match else f"line_{begin + 1}"
+        for offset in range(begin, end, MAX_CHUNK_LINES):
+            stop = min(offset + MAX_CHUNK_LINES, end)
+            chunks.append((name, offset + 1, stop, "\n".join(lines[offset:stop])))
+    return chunks
+
+
+def chunk_by_window(text):
+    lines = text.splitlines()
+    return [
+        (f"lines_{i + 1}", i + 1, min(i + WINDOW_LINES, len(lines)), "\n".join(lines[i:i + WINDOW_LINES]))
+        for i in range(0, len(lines), WINDOW_LINES)
+    ]
+
+
+def chunk_source(file_path, text):
+    chunks = None
+    if file_path.endswith(".py"):
+        chunks = chunk_python(text)
+    else:
+        chunks = chunk_by_declarations(text)
+    return chunks or chunk_by_window(text)
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS files ("
+    " path TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL, sha256 TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS chunks ("
+    " id INTEGER PRIMARY KEY, path TEXT NOT NULL, name TEXT NOT NULL, start_line INTEGER,"
+    " end_line INTEGER, text TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_chunks_path ON chunks(path)",
+    "CREATE TABLE IF NOT EXISTS chunk_terms (term TEXT NOT NULL, chunk_id INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_chunk_terms_term ON chunk_terms(term)",
+    "CREATE INDEX IF NOT EXISTS idx_chunk_terms_chunk ON chunk_terms(chunk_id)",
+)
+
+
+def file_term(file_path):
+    # Source file names are looked up in chunk_terms next to identifiers
+    return "file:" + os.path.basename(file_path).lower()
+
+
+class CodeIndex:
+    """
+    Persistent, incrementally updated index of a project's source code.
+    A manifest of (mtime, size, sha256) per file means only changed files are
+    re-read and re-chunked; chunks are stored per function/class, with an indexed
+    (term, chunk) table so a search only reads the chunks sharing a term with the query.
+    """
+
+    def __init__(self, project_path, index_path=None):
+        self.project_path = os.path.abspath(project_path)
+        if index_path is None:
+            digest = hashlib.sha1(self.project_path.encode("utf-8")).hexdigest()[:12]
+            os.makedirs(CODE_INDEX_DIR, exist_ok=True)
+            index_path = os.path.join(CODE_INDEX_DIR, f"code_index_{digest}.sqlite")
+        # Concurrent jobs (service mode) share the file: WAL lets searches run during an update
+        self.conn = sqlite3.connect(index_path, timeout=CODE_INDEX_LOCK_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        if self._chunker_version() != CHUNKER_VERSION:
+            self._create_schema()
+
+    def _chunker_version(self):
+        try:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'chunker_version'").fetchone()
+        except sqlite3.OperationalError:  # new file
+            return None
+        return row[0] if row else None
+
+    def _create_schema(self):
+        # Another process may be doing the same: the write lock makes one create, the other re-check
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            if self._chunker_version() != CHUNKER_VERSION:
+                for table in ("files", "chunks", "chunk_terms"):
+                    self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+                for statement in SCHEMA:
+                    self.conn.execute(statement)
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('chunker_version', ?)", (CHUNKER_VERSION,))
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+    def _iter_source_files(self):
+        for root, dirs, files in os.walk(self.project_path):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            for file in files:
+                if file.endswith(SOURCE_EXTENSIONS):
+                    yield os.path.join(root, file)
+
+    def update(self, max_size_kb=MAX_FILE_KB):
+        """
+        Brings the index up to date with the project tree. Returns the number of re-indexed files.
+        Every file is stat'ed; only those whose mtime or size changed are re-read.
+        Updates of the same index are serialized: a second caller waits, then finds it up to date.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            changed = self._update(max_size_kb)
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        return changed
+
+    def _update(self, max_size_kb):
+        manifest = {path: (mtime, size, sha) for path, mtime, size, sha in self.conn.execute("SELECT * FROM files")}
+        seen = set()
+        changed = 0
+        for file_path in self._iter_source_files():
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            if stat.st_size > max_size_kb * 1024:
+                continue
+            seen.add(file_path)
+            previous = manifest.get(file_path)
+            if previous and previous[0] == stat.st_mtime and previous[1] == stat.st_size:
+                continue
+            try:
+                with open(file_path, "rb") as f:
+                    data = f.read()
+                text = data.decode("utf-8")
+            except (UnicodeDecodeError, PermissionError, IsADirectoryError, OSError):
+                continue
+            sha = hashlib.sha256(data).hexdigest()
+            if previous is None or previous[2] != sha:
+                self._index_file(file_path, text)
+                changed += 1
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                              (file_path, stat.st_mtime, stat.st_size, sha))
+
+        for path in manifest:
+            if path not in seen:
+                self._remove_file(path)
+                self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('updated_at', ?)", (str(time.time()),))
+        return changed
+
+    def _remove_file(self, file_path):
+        self.conn.execute("DELETE FROM chunk_terms WHERE chunk_id IN (SELECT id FROM chunks WHERE path = ?)",
+                          (file_path,))
+        self.conn.execute("DELETE FROM chunks WHERE path = ?", (file_path,))
+
+    def _index_file(self, file_path, text):
+        self._remove_file(file_path)
+        for name, start, end, chunk_text in chunk_source(file_path, text):
+            chunk_id = self.conn.execute(
+                "INSERT INTO chunks (path, name, start_line, end_line, text) VALUES (?, ?, ?, ?, ?)",
+                (file_path, name, start, end, chunk_text),
+            ).lastrowid
+            terms = identifier_terms(chunk_text) | identifier_terms(name) | {file_term(file_path)}
+            self.conn.executemany("INSERT INTO chunk_terms VALUES (?, ?)", ((term, chunk_id) for term in terms))
+
+    def _rows_in(self, sql, values):
+        """Runs sql, whose "{}" stands for the placeholders of an IN list, over values in batches."""
+        values = list(values)
+        for i in range(0, len(values), QUERY_BATCH):
+            batch = values[i:i + QUERY_BATCH]
+            yield from self.conn.execute(sql.format(", ".join("?" * len(batch))), batch)
+
+    def search(self, query_text, top_k=20):
+        """
+        Ranks chunks against a log summary: source file names and chunk (function/class)
+        names mentioned in the text weigh most, shared identifiers are weighted by rarity.
+        Returns [(score, chunk_id, path, name, start_line, end_line)].
+        """
+        query_terms = identifier_terms(query_text)
+        query_files = {file_term(name) for name in SOURCE_FILE_PATTERN.findall(query_text)}
+        if not query_terms and not query_files:
+            return []
+
+        total = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        document_frequency = dict(self._rows_in(
+            "SELECT term, COUNT(*) FROM chunk_terms WHERE term IN ({}) GROUP BY term", query_terms))
+        matched = {}
+        file_matches = set()
+        for term, chunk_id in self._rows_in(
+                "SELECT term, chunk_id FROM chunk_terms WHERE term IN ({})", query_terms | query_files):
+            if term in query_files:
+                file_matches.add(chunk_id)
+            else:
+                matched.setdefault(chunk_id, []).append(term)
+
+        scored = []
+        for chunk_id in matched.keys() | file_matches:
+            score = sum(math.log(1 + total / document_frequency[term]) for term in matched.get(chunk_id, ()))
+            score += 10 if chunk_id in file_matches else 0
+            scored.append([score, chunk_id])
+
+        # Chunk names are only known per row: add the name bonus, then rank
+        rows = {row[0]: row[1:] for row in self._rows_in(
+            "SELECT id, path, name, start_line, end_line FROM chunks WHERE id IN ({})",
+            [chunk_id for _, chunk_id in scored])}
+        for entry in scored:
+            if rows[entry[1]][1].split(".")[-1].lower() in query_terms:
+                entry[0] += 5
+        scored.sort(reverse=True)
+        return [(round(score, 3), chunk_id, *rows[chunk_id]) for score, chunk_id in scored[:top_k]]
+
+    def chunk_text(self, chunk_id):
+        row = self.conn.execute("SELECT text FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+        return row[0] if row else ""
+
+    def close(self):
+        self.conn.close()
+
+
+def retrieve_relevant_code(project_path, log_summary, max_chars=24000, top_k=20):
+    """
+    Updates the project's code index and returns only the chunks relevant to the
+    log summary, formatted for the code agent prompt, within max_chars.
+    """
+    index = CodeIndex(project_path)
+    try:
+        changed = index.update()
+        print(f"🗂️ Code index updated: {changed} file(s) re-indexed.")
+        source_code = ""
+        for score, chunk_id, path, name, start, end in index.search(log_summary, top_k=top_k):
+            block = f"\n# File: {path} ({name}, lines {start}-{end})\n{index.chunk_text(chunk_id)}\n"
+            if source_code and len(source_code) + len(block) > max_chars:
+                break
+            source_code += block[:max_chars]
+        return source_code
+    finally:
+        index.close()
@@ -0,0 +1,281 @@
+import os
+import re
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_LOGIN_TIMEOUT = int(os.getenv("DB_LOGIN_TIMEOUT", "10"))  # seconds
+DB_QUERY_TIMEOUT = int(os.getenv("DB_QUERY_TIMEOUT", "30"))  # seconds, per statement
+DB_LOCK_TIMEOUT_MS = int(os.getenv("DB_LOCK_TIMEOUT_MS", "2000"))
+DB_MAX_IDLE_SECONDS = int(os.getenv("DB_MAX_IDLE_SECONDS", "300"))
+
+# Applied to every pooled session: diagnostics must never block or be blocked for long.
+SESSION_SETTINGS = [
+    "SET NOCOUNT ON",
+    "SET TRANSACTION ISOLATION LEVEL READ UNCOMMITTED",
+    "SET LOCK_TIMEOUT {lock_timeout_ms}",
+    "SET DEADLOCK_PRIORITY LOW",
+]
+
+ALLOWED_DBCC = {"INPUTBUFFER", "SQLPERF", "OPENTRAN", "SHOW_STATISTICS", "TRACESTATUS", "USEROPTIONS"}
+ALLOWED_PROCEDURES = {"sp_who", "sp_who2", "sp_lock", "sp_spaceused", "sp_helpindex", "sp_helpfile",
+                      "sp_helpdb", "sp_whoisactive", "sp_blitzfirst", "sp_blitzwho", "sp_blitzlock"}
+FORBIDDEN_KEYWORDS = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|DROP|ALTER|CREATE|TRUNCATE|GRANT|REVOKE|DENY|INTO|SHUTDOWN|KILL|"
+    r"BACKUP|RESTORE|RECONFIGURE|WAITFOR|BULK|OPENROWSET|OPENQUERY|OPENDATASOURCE|xp_\w+)\b",
+    re.IGNORECASE,
+)
+# Keywords that start a statement; T-SQL needs no ';' between statements, so any of these
+# past the start of a query begins a second one
+STATEMENT_KEYWORDS = {"DBCC", "EXEC", "EXECUTE", "DECLARE", "SET", "USE", "IF", "WHILE", "BEGIN",
+                      "PRINT", "RAISERROR", "THROW", "RETURN", "GOTO", "OPEN", "CLOSE", "DEALLOCATE",
+                      "COMMIT", "ROLLBACK", "SAVE", "CHECKPOINT", "REVERT", "SETUSER", "GO"}
+# Words allowed after WITH inside a statement (table hints, TOP ... WITH TIES, DBCC options)
+WITH_OPTIONS = {"TIES", "ROLLUP", "CUBE", "NO_INFOMSGS", "TABLERESULTS", "ALL_ERRORMSGS"}
+SET_OPERATORS = {"UNION", "ALL", "EXCEPT", "INTERSECT"}
+TOKEN_PATTERN = re.compile(r"[A-Za-z_@#][\w@#$]*|[()]")
+
+
+class UnsafeSQLError(ValueError):
+    pass
+
+
+def mask_sql(sql):
+    """
+    One left-to-right pass over the batch that blanks out everything that is not code:
+    comments (nested /* */ included) become spaces, the content of string literals and
+    quoted identifiers becomes 'x'. The result has the same length and line breaks as sql,
+    so positions found in it apply to the original. Raises UnsafeSQLError on an
+    unterminated literal or comment.
+    """
+    out = []
+    i, n = 0, len(sql)
+    while i < n:
+        char = sql[i]
+        pair = sql[i:i + 2]
+        if pair == "--":
+            end = sql.find("\n", i)
+            end = n if end == -1 else end
+            out.append(" " * (end - i))
+            i = end
+        elif pair == "/*":
+            depth, j = 1, i + 2
+            while j < n and depth:
+                if sql[j:j + 2] == "/*":
+                    depth, j = depth + 1, j + 2
+                elif sql[j:j + 2] == "*/":
+                    depth, j = depth - 1, j + 2
+                else:
+                    j += 1
+            if depth:
+                raise UnsafeSQLError("Unterminated comment")
+            out.append(re.sub(r"[^\n]", " ", sql[i:j]))
+            i = j
+        elif char in "'\"[":
+            close = "]" if char == "[" else char
+            j = i + 1
+            while True:
+                j = sql.find(close, j)
+                if j == -1:
+                    raise UnsafeSQLError("Unterminated string literal or quoted identifier")
+                if sql[j + 1:j + 2] == close:  # doubled quote is an escaped quote
+                    j += 2
+                    continue
+                break
+            out.append(char + re.sub(r"[^\n]", "x", sql[i + 1:j]) + close)
+            i = j + 1
+        else:
+            out.append(char)
+            i += 1
+    return "".join(out)
+
+
+def split_statements(sql):
+    """Splits a batch on ';' and GO separators, ignoring separators inside string literals and comments."""
+    masked = mask_sql(sql)
+    statements = []
+    start = 0
+    for match in re.finditer(r";|^\s*GO\s*$", masked, re.IGNORECASE | re.MULTILINE):
+        statements.append(sql[start:match.start()])
+        start = match.end()
+    statements.append(sql[start:])
+    return [s.strip() for s in statements if s.strip()]
+
+
+def _check_single_statement(tokens):
+    # SELECT/WITH queries may contain one top-level SELECT (plus UNION/EXCEPT/INTERSECT
+    # branches) and SELECTs nested in parentheses; DBCC and EXEC none at all
+    first = tokens[0]
+    main_selects = 1 if first == "SELECT" else 0
+    allowed_selects = 1 if first in ("SELECT", "WITH") else 0
+    depth = 0
+    for position in range(1, len(tokens)):
+        token, previous = tokens[position], tokens[position - 1]
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+            if depth < 0:
+                raise UnsafeSQLError("Unbalanced parentheses")
+        elif token in STATEMENT_KEYWORDS:
+            raise UnsafeSQLError(f"Expected exactly one statement, found a second one starting with {token}")
+        elif token == "SELECT" and depth == 0 and previous not in SET_OPERATORS:
+            main_selects += 1
+            if main_selects > allowed_selects:
+                raise UnsafeSQLError("Expected exactly one statement, found a second SELECT")
+        elif token == "WITH":
+            following = tokens[position + 1] if position + 1 < len(tokens) else ""
+            if following != "(" and following not in WITH_OPTIONS:
+                raise UnsafeSQLError("Expected exactly one statement, found a second one starting with WITH")
+
+
+def check_sql_allowed(sql):
+    """
+    Static allow-list for LLM-generated SQL: a single read-only SELECT/WITH query,
+    a diagnostic DBCC command or a known read-only system procedure.
+    Raises UnsafeSQLError otherwise.
+
+    This is the only write protection: ApplicationIntent=ReadOnly just routes to a
+    readable secondary when there is one, a primary still accepts writes.
+    """
+    code = mask_sql(sql)
+    statements = split_statements(code)
+    if len(statements) != 1:
+        raise UnsafeSQLError(f"Expected exactly one statement, got {len(statements)}")
+    statement = statements[0]
+    original = split_statements(sql)[0]
+    tokens = [t.upper() for t in TOKEN_PATTERN.findall(statement)]
+    if not tokens:
+        raise UnsafeSQLError("Empty statement")
+    first = tokens[0]
+
+    if first in ("SELECT", "WITH"):
+        pass
+    elif first == "DBCC":
+        if len(tokens) < 2 or tokens[1] not in ALLOWED_DBCC:
+            raise UnsafeSQLError(f"DBCC command not allowed: {original[:60]}")
+    elif first in ("EXEC", "EXECUTE"):
+        words = original.split()
+        procedure = words[1].split(".")[-1].strip("[]").lower() if len(words) > 1 else ""
+        if procedure not in ALLOWED_PROCEDURES:
+            raise UnsafeSQLError(f"Procedure not allowed: {procedure or original[:60]}")
+    else:
+        raise UnsafeSQLError(f"Only SELECT, WITH, DBCC and EXEC of diagnostic procedures are allowed, got {first}")
+
+    forbidden = FORBIDDEN_KEYWORDS.search(statement)
+    if forbidden:
+        raise UnsafeSQLError(f"Forbidden keyword in query: {forbidden.group(0)}")
+    _check_single_statement(tokens)
+    return sql
+
+
+class ConnectionPool:
+    """
+    Pool of read-only, diagnostic SQL Server connections for one connection string.
+    Connections are opened with autocommit, a per-statement query timeout and the
+    SESSION_SETTINGS above, and reused across db_agent runs in the same process.
+    """
+
+    def __init__(self, conn_str, size=DB_POOL_SIZE, query_timeout=DB_QUERY_TIMEOUT,
+                 lock_timeout_ms=DB_LOCK_TIMEOUT_MS, read_only=True):
+        if read_only and "applicationintent" not in conn_str.lower():
+            conn_str = conn_str.rstrip(";") + ";ApplicationIntent=ReadOnly"
+        self.conn_str = conn_str
+        self.size = size
+        self.query_timeout = query_timeout
+        self.lock_timeout_ms = lock_timeout_ms
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        import pyodbc
+        conn = pyodbc.connect(self.conn_str, autocommit=True, timeout=DB_LOGIN_TIMEOUT)
+        conn.timeout = self.query_timeout
+        cursor = conn.cursor()
+        for setting in SESSION_SETTINGS:
+            cursor.execute(setting.format(lock_timeout_ms=self.lock_timeout_ms))
+        cursor.close()
+        return conn
+
+    def _checkout(self):
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.time() - last_used > DB_MAX_IDLE_SECONDS:
+                # Possibly dropped by the server or a firewall: check before reuse
+                try:
+                    conn.cursor().execute("SELECT 1").fetchall()
+                except Exception:
+                    self._close_quietly(conn)
+                    continue
+            return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection; it is discarded instead of returned if the block raises a
+        connection error or is interrupted (a cancelled step may leave a result half-read).
+        """
+        self._slots.acquire()
+        conn = None
+        healthy = True
+        try:
+            conn = self._checkout()
+            yield conn
+        except BaseException as e:
+            healthy = isinstance(e, Exception) and not is_connection_error(e)
+            raise
+        finally:
+            if conn is not None:
+                if healthy:
+                    self._idle.put((conn, time.time()))
+                else:
+                    self._close_quietly(conn)
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close_quietly(conn)
+
+
+def is_connection_error(error):
+    # SQLSTATE class 08 = connection exception
+    state = error.args[0] if getattr(error, "args", None) else ""
+    return isinstance(state, str) and state.startswith("08")
+
+
+def execute_guarded(cursor, sql, max_rows=None):
+    """Runs an allow-listed statement, with SET ROWCOUNT limiting the rows the server produces."""
+    check_sql_allowed(sql)
+    # Every guarded statement sets its own cap (one extra row so callers can tell the
+    # result was capped), so a cap never leaks into the next use of a pooled session
+    rowcount = int(max_rows) + 1 if max_rows else 0
+    cursor.execute(f"SET ROWCOUNT {rowcount};\n{sql}")
+    return cursor
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(conn_str):
+    """Returns the process-wide pool for a connection string, created on first use."""
+    with _pools_lock:
+        if conn_str not in _pools:
+            _pools[conn_str] = ConnectionPool(conn_str)
+        return _pools[conn_str]
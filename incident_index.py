@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from log_triage import mask_line
+
+INCIDENT_INDEX_PATH = os.getenv("INCIDENT_INDEX_PATH", os.path.join(".cache", "incidents.sqlite"))
+# Repeats older than this open a new ticket instead of updating the old one
+JIRA_DEDUP_WINDOW_DAYS = float(os.getenv("JIRA_DEDUP_WINDOW_DAYS", "30"))
+# A claim whose run neither created a ticket nor released it in this time (crashed run) can be taken over
+INCIDENT_CLAIM_SECONDS = float(os.getenv("INCIDENT_CLAIM_SECONDS", "3600"))
+SIGNATURE_TEMPLATES = 5
+
+
+def triage_signature(triage, max_templates=SIGNATURE_TEMPLATES):
+    """
+    Normalized error signature of a log, order-independent: all of its ERROR/FATAL templates,
+    so a new error next to known ones makes a new incident. Logs without errors fall back
+    to their most frequent templates.
+    """
+    templates = [c for c in triage.templates() if c["level"] in ("FATAL", "ERROR")] or triage.templates()[:max_templates]
+    return "\n".join(sorted(c["template"] for c in templates))
+
+
+def summary_signature(log_summary):
+    """Fallback signature from the LLM log summary: masked, lowercased words."""
+    masked = mask_line(str(log_summary)).lower()
+    return " ".join(re.findall(r"[a-z_<>]{3,}", masked))
+
+
+def fingerprint(signature):
+    return hashlib.sha1(signature.encode("utf-8")).hexdigest()
+
+
+class IncidentIndex:
+    """
+    Local map of incident fingerprints to the JIRA issue tracking them, with occurrence counts.
+    A run claims a fingerprint (a row with an empty issue key) before analyzing it, so
+    concurrent runs in other threads or processes do not open a second ticket for it.
+    """
+
+    def __init__(self, path=INCIDENT_INDEX_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        # Service, batch and follow runs may share the file: wait for each other's claims
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS incidents ("
+            " fingerprint TEXT PRIMARY KEY, issue_key TEXT NOT NULL, signature TEXT,"
+            " first_seen REAL NOT NULL, last_seen REAL NOT NULL, occurrences INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    def find(self, incident_fingerprint, window_days=JIRA_DEDUP_WINDOW_DAYS):
+        """Returns {"issue_key", "occurrences", ...} for a recent incident with a ticket, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT issue_key, signature, first_seen, last_seen, occurrences FROM incidents WHERE fingerprint = ?",
+                (incident_fingerprint,),
+            ).fetchone()
+        if row is None or not row[0] or time.time() - row[3] > window_days * 86400:
+            return None
+        return {"issue_key": row[0], "signature": row[1], "first_seen": row[2], "last_seen": row[3],
+                "occurrences": row[4]}
+
+    def claim(self, incident_fingerprint, signature="", window_days=JIRA_DEDUP_WINDOW_DAYS):
+        """
+        Atomically claims the fingerprint for the calling run. Returns None when claimed,
+        else the existing {"issue_key", "occurrences", ...}; issue_key is empty while the
+        run holding the claim has not created its ticket yet.
+        """
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two processes cannot both see no row
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT issue_key, signature, first_seen, last_seen, occurrences FROM incidents WHERE fingerprint = ?",
+                    (incident_fingerprint,),
+                ).fetchone()
+                expired = row is not None and (now - row[3] > window_days * 86400 if row[0]
+                                               else now - row[2] > INCIDENT_CLAIM_SECONDS)
+                if row is None or expired:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO incidents VALUES (?, '', ?, ?, ?, 1)",
+                        (incident_fingerprint, signature, now, now),
+                    )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        if row is None or expired:
+            return None
+        return {"issue_key": row[0], "signature": row[1], "first_seen": row[2], "last_seen": row[3],
+                "occurrences": row[4]}
+
+    def release(self, incident_fingerprint):
+        """Drops this run's claim when it ends without a ticket, so the next occurrence is analyzed."""
+        with self._lock:
+            self._conn.execute("DELETE FROM incidents WHERE fingerprint = ? AND issue_key = ''",
+                               (incident_fingerprint,))
+            self._conn.commit()
+
+    def record_new(self, incident_fingerprint, issue_key, signature=""):
+        # Keeps the occurrences counted while the claim was pending
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO incidents VALUES (?, ?, ?, ?, ?, 1) ON CONFLICT(fingerprint) DO UPDATE SET"
+                " issue_key = excluded.issue_key, signature = excluded.signature, last_seen = excluded.last_seen",
+                (incident_fingerprint, issue_key, signature, now, now),
+            )
+            self._conn.commit()
+
+    def record_repeat(self, incident_fingerprint):
+        """Bumps the occurrence count; returns the new count."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE incidents SET occurrences = occurrences + 1, last_seen = ? WHERE fingerprint = ?",
+                (time.time(), incident_fingerprint),
+            )
+            self._conn.commit()
+            row = self._conn.execute(
+                "SELECT occurrences FROM incidents WHERE fingerprint = ?", (incident_fingerprint,)
+            ).fetchone()
+        return row[0] if row else 0
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_incident_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = IncidentIndex()
+    return _index
@@ -0,0 +1,138 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+
+INCIDENT_KB_DB_PATH = os.getenv("INCIDENT_KB_DB_PATH", os.path.join(".cache", "incident_kb.sqlite"))
+# Cosine score above which a past incident is shown to the code and DB agents as a possible match
+INCIDENT_KB_MATCH_SCORE = float(os.getenv("INCIDENT_KB_MATCH_SCORE", "0.85"))
+# Stricter score above which its root cause is reused and the DB drill-down skipped (semantic embeddings only)
+INCIDENT_KB_REUSE_SCORE = float(os.getenv("INCIDENT_KB_REUSE_SCORE", "0.95"))
+INCIDENT_KB_DISABLED = os.getenv("INCIDENT_KB_DISABLED", "false").lower() == "true"
+MAX_FIELD_CHARS = 4000
+DOCUMENT_ID_PATTERN = re.compile(r"^\[Incident #(\d+)\]")
+
+
+def match_text(signature, log_summary):
+    """What incidents are compared on: the error signature when known, plus the log summary."""
+    return f"{signature or ''}\n{str(log_summary or '')[:MAX_FIELD_CHARS]}"
+
+
+class IncidentKB:
+    """
+    Completed analyses (signature, decision, root cause, executed SQL, results summary and
+    JIRA key) stored in SQLite, with a document per incident in vector_db_client's persistent
+    vector store. The documents also serve as the DB agent's retrieval context.
+    """
+
+    def __init__(self, path=INCIDENT_KB_DB_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS incidents ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, fingerprint TEXT, signature TEXT,"
+            " log_summary TEXT, decision TEXT, code_analysis TEXT, db_result TEXT, sql_queries TEXT,"
+            " jira_key TEXT)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def document(incident_id, record):
+        """Compact text of an incident, as shown to the LLM."""
+        decision = record.get("decision") or {}
+        lines = [f"[Incident #{incident_id}] JIRA: {record.get('jira_key') or 'none'}",
+                 f"Log summary: {str(record.get('log_summary') or '')[:1500]}",
+                 f"Decision: {decision.get('reason', '') if isinstance(decision, dict) else decision}"]
+        if record.get("code_analysis"):
+            lines.append(f"Code root cause: {record['code_analysis'][:1500]}")
+        if record.get("db_result"):
+            lines.append(f"DB analysis: {record['db_result'][:1500]}")
+        if record.get("sql_queries"):
+            lines.append("SQL run: " + " | ".join(q[:300] for q in record["sql_queries"][:5]))
+        return "\n".join(lines)
+
+    def add(self, record):
+        """
+        record: fingerprint, signature, log_summary, decision (dict), code_analysis, db_result,
+        sql_queries (list), jira_key. Returns the new incident id.
+        """
+        from vector_db_client import add_context, save_vector_db
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO incidents (created, fingerprint, signature, log_summary, decision, code_analysis,"
+                " db_result, sql_queries, jira_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), record.get("fingerprint"), record.get("signature"),
+                 str(record.get("log_summary") or "")[:MAX_FIELD_CHARS], json.dumps(record.get("decision")),
+                 str(record.get("code_analysis") or "")[:MAX_FIELD_CHARS],
+                 str(record.get("db_result") or "")[:MAX_FIELD_CHARS],
+                 json.dumps(record.get("sql_queries") or []), record.get("jira_key")),
+            )
+            self._conn.commit()
+            incident_id = cursor.lastrowid
+            add_context(self.document(incident_id, record),
+                        key_text=match_text(record.get("signature"), record.get("log_summary")))
+            save_vector_db()
+        return incident_id
+
+    def get(self, incident_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, created, fingerprint, signature, log_summary, decision, code_analysis, db_result,"
+                " sql_queries, jira_key FROM incidents WHERE id = ?", (incident_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "created", "fingerprint", "signature", "log_summary", "decision", "code_analysis",
+                "db_result", "sql_queries", "jira_key")
+        record = dict(zip(keys, row))
+        record["decision"] = json.loads(record["decision"] or "null")
+        record["sql_queries"] = json.loads(record["sql_queries"] or "[]")
+        return record
+
+    def find_similar(self, signature, log_summary, top_k=3):
+        """[(record, score)] of the closest past incidents, best first."""
+        from vector_db_client import search_context
+        matches = []
+        for text, score in search_context(match_text(signature, log_summary), top_k=top_k):
+            found = DOCUMENT_ID_PATTERN.match(text)
+            record = self.get(int(found.group(1))) if found else None
+            if record:
+                matches.append((record, score))
+        return matches
+
+    def best_match(self, signature, log_summary, min_score=INCIDENT_KB_MATCH_SCORE):
+        """The closest past incident if it scores at least min_score, else None."""
+        matches = self.find_similar(signature, log_summary, top_k=1)
+        if matches and matches[0][1] >= min_score:
+            record, score = matches[0]
+            return {**record, "score": score}
+        return None
+
+
+def reusable(match, min_score=INCIDENT_KB_REUSE_SCORE):
+    """
+    Whether a best_match is close enough to reuse its analysis instead of redoing it. Hash
+    embeddings only measure shared words, so with them a match is never more than a hint.
+    """
+    from vector_db_client import embeddings_are_semantic
+    return bool(match) and match["score"] >= min_score and embeddings_are_semantic()
+
+
+_kb = None
+_kb_lock = threading.Lock()
+
+
+def get_incident_kb():
+    """Process-wide knowledge base, or None when INCIDENT_KB_DISABLED."""
+    global _kb
+    if INCIDENT_KB_DISABLED:
+        return None
+    if _kb is None:
+        with _kb_lock:
+            if _kb is None:
+                _kb = IncidentKB()
+    return _kb
@@ -1,34 +1,222 @@
 import os
+import json
+import time
+import random
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from llm_cache import cache_key, get_llm_cache
+from tracing import span, current_span
+from pipeline import check_cancelled
 
 # Load environment variables from .env file
 load_dotenv()
 
-LLM_API_URL = "https://dev01-llm-platform.itf.csodqa.com/v2/chat/completions"
+LLM_API_URL = os.getenv("LLM_API_URL", "https://dev01-llm-platform.itf.csodqa.com/v2/chat/completions")
 LLM_API_TOKEN = os.getenv("LLM_API_TOKEN")  # Or paste your token directly (not recommended for security)
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "300"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
 
-def chat_with_model(prompt: str, model: str = "llama-3.1-70b") -> str:
-    print(f"🤖 Chatting with custom LLM model '{model}'...\n")
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {LLM_API_TOKEN}"
-    }
-    payload = {
-        "model": model,
-        "max_tokens": 1100,
-        "stream": False,
-        "enable_guardrails": False,
-        "messages": [
-            {"role": "user", "content": prompt}
-        ]
-    }
-    try:
-        response = requests.post(LLM_API_URL, headers=headers, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        # Adjust this if your API returns the message differently
-        return data["choices"][0]["message"]["content"]
-    except Exception as e:
-        print(f"❌ Error while calling custom LLM API: {e}")
-        return "Error: Unable to get a response from the model."
+# Rate limiting and transient server errors are worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+def record_usage(data):
+    """Copies the token counts of an OpenAI-style response onto the current span."""
+    usage = data.get("usage") if isinstance(data, dict) else None
+    if usage:
+        current_span().set(**{key: usage[key] for key in ("prompt_tokens", "completion_tokens", "total_tokens")
+                              if isinstance(usage.get(key), int)})
+
+
+class LLMClient:
+    """
+    Reusable client for the OpenAI-compatible chat completions endpoint.
+    Keeps a pooled keep-alive HTTP session, retries 429/5xx and connection errors
+    with jittered exponential backoff and caps the number of concurrent requests.
+    """
+
+    def __init__(self, api_url=LLM_API_URL, api_token=LLM_API_TOKEN,
+                 connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT,
+                 max_retries=LLM_MAX_RETRIES, max_concurrency=LLM_MAX_CONCURRENCY,
+                 backoff_base=1.0, backoff_max=30.0):
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_token}"
+        })
+
+    def _payload(self, prompt, model, max_tokens, stream):
+        return {
+            "model": model,
+            "max_tokens": max_tokens,
+            "stream": stream,
+            "enable_guardrails": False,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ]
+        }
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = min(float(retry_after), self.backoff_max)
+        else:
+            # Full jitter: spreads retries of concurrent callers apart
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        print(f"🔁 Retrying LLM call in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+        current_span().add(retries=1, backoff_seconds=round(delay, 3))
+        time.sleep(delay)
+
+    def _post(self, payload, stream=False):
+        """Sends the request, retrying transient failures. Must be called holding the semaphore."""
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                response = self.session.post(self.api_url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt:
+                    raise LLMError(f"LLM request failed after {attempt + 1} attempts: {e}") from e
+                self._backoff(attempt)
+                continue
+
+            if response.status_code in RETRY_STATUSES and not last_attempt:
+                response.close()
+                self._backoff(attempt, response)
+                continue
+            try:
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                response.close()
+                raise LLMError(f"LLM request failed: {e}") from e
+            return response
+
+    def chat(self, prompt: str, model: str = "llama-3.1-70b", max_tokens: int = 1100) -> str:
+        with self._semaphore:
+            response = self._post(self._payload(prompt, model, max_tokens, stream=False))
+            try:
+                data = response.json()
+                record_usage(data)
+                # Adjust this if your API returns the message differently
+                return data["choices"][0]["message"]["content"]
+            except (ValueError, KeyError, IndexError) as e:
+                raise LLMError(f"Unexpected LLM response: {e}") from e
+
+    def stream_chat(self, prompt: str, model: str = "llama-3.1-70b", max_tokens: int = 1100):
+        """Yields content tokens as the server generates them (server-sent events)."""
+        with self._semaphore:
+            response = self._post(self._payload(prompt, model, max_tokens, stream=True), stream=True)
+            with response:
+                for line in self._iter_lines(response):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                        # Servers that report usage when streaming send it with the last chunk
+                        record_usage(chunk)
+                        if not chunk.get("choices"):
+                            continue
+                        delta = chunk["choices"][0].get("delta") or {}
+                    except (ValueError, KeyError, IndexError) as e:
+                        raise LLMError(f"Unexpected LLM stream chunk: {e}") from e
+                    if delta.get("content"):
+                        yield delta["content"]
+
+    @staticmethod
+    def _iter_lines(response):
+        # A connection dropped mid-stream surfaces here, not in _post
+        try:
+            yield from response.iter_lines(decode_unicode=True)
+        except requests.RequestException as e:
+            raise LLMError(f"LLM stream interrupted: {e}") from e
+
+    async def achat(self, prompt: str, model: str = "llama-3.1-70b", max_tokens: int = 1100) -> str:
+        # The pooled session is thread-safe for requests, so run the blocking call in a worker thread
+        import asyncio
+        return await asyncio.to_thread(self.chat, prompt, model, max_tokens)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Returns the process-wide client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+def chat_with_model(prompt: str, model: str = "llama-3.1-70b", stream: bool = False, on_token=None,
+                    use_cache: bool = True) -> str:
+    """
+    Sends a prompt and returns the full response text.
+    Responses are served from / stored in the on-disk LLM cache unless use_cache is False.
+    With stream=True, tokens are passed to on_token as they arrive.
+    Raises LLMError once retries are exhausted, so a failed call is never mistaken for an answer.
+    """
+    # A timed-out pipeline step stops here instead of paying for more LLM calls
+    check_cancelled()
+    with span("llm.chat", kind="llm", model=model, prompt_chars=len(prompt), stream=stream) as llm_span:
+        cache = get_llm_cache() if use_cache else None
+        key = cache_key(model, prompt, max_tokens=1100)
+        if cache:
+            cached = cache.get(key)
+            if cached is not None:
+                print(f"💾 LLM cache hit for model '{model}'\n")
+                llm_span.set(cache_hit=True, response_chars=len(cached))
+                if on_token:
+                    on_token(cached)
+                return cached
+
+        print(f"🤖 Chatting with custom LLM model '{model}'...\n")
+        client = get_llm_client()
+        try:
+            if not stream:
+                response = client.chat(prompt, model)
+            else:
+                tokens = []
+                for token in client.stream_chat(prompt, model):
+                    tokens.append(token)
+                    if on_token:
+                        on_token(token)
+                response = "".join(tokens)
+        except LLMError as e:
+            print(f"❌ Error while calling custom LLM API: {e}")
+            raise
+
+        llm_span.set(cache_hit=False, response_chars=len(response))
+        if cache:
+            cache.set(key, response)
+        return response
+
+
+async def achat_with_model(prompt: str, model: str = "llama-3.1-70b", use_cache: bool = True) -> str:
+    import asyncio
+    return await asyncio.to_thread(chat_with_model, prompt, model, use_cache=use_cache)
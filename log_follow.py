@@ -0,0 +1,277 @@
+import os
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from log_reader import DEFAULT_MAX_LINE_CHARS
+from log_triage import LogTriage
+
+FOLLOW_STATE_PATH = os.getenv("FOLLOW_STATE_PATH", os.path.join(".cache", "follow_state.json"))
+FOLLOW_POLL_SECONDS = float(os.getenv("FOLLOW_POLL_SECONDS", "1"))
+# Error/warning events per minute (all followed files) that trigger an analysis, 0 disables
+FOLLOW_RATE_THRESHOLD = int(os.getenv("FOLLOW_RATE_THRESHOLD", "100"))
+# Wait this long after a trigger so the whole burst lands in the same analysis
+FOLLOW_DEBOUNCE_SECONDS = float(os.getenv("FOLLOW_DEBOUNCE_SECONDS", "30"))
+# Minimum time between two analyses
+FOLLOW_COOLDOWN_SECONDS = float(os.getenv("FOLLOW_COOLDOWN_SECONDS", "300"))
+# Events that have not triggered an analysis within this time are dropped from the window
+FOLLOW_WINDOW_SECONDS = float(os.getenv("FOLLOW_WINDOW_SECONDS", "600"))
+# New files are read from their end (like tail -F) unless this is set
+FOLLOW_FROM_START = os.getenv("FOLLOW_FROM_START", "false").lower() == "true"
+MAX_BYTES_PER_POLL = 8 * 1024 * 1024
+MAX_KNOWN_TEMPLATES = 10000
+STATE_SAVE_SECONDS = 5
+
+
+class FollowedFile:
+    """
+    Incremental reader of one growing log file. Tracks the byte offset of the last complete
+    line; a partial last line is left for the next poll. A new inode at the path means the
+    file was rotated (the old one is drained first), a size below the offset means it was
+    truncated (reading restarts at 0).
+    """
+
+    def __init__(self, path, offset=None, inode=None, max_line_chars=DEFAULT_MAX_LINE_CHARS):
+        self.path = path
+        self.offset = offset
+        self.inode = inode
+        self.max_line_chars = max_line_chars
+        self._file = None
+        self._skipping = False
+
+    def _open(self):
+        try:
+            handle = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        stat = os.fstat(handle.fileno())
+        if self.offset is None:
+            self.offset = 0 if FOLLOW_FROM_START else stat.st_size
+        elif self.inode != stat.st_ino or stat.st_size < self.offset:
+            print(f"🔄 {self.path} changed while not followed, reading it from the start")
+            self.offset = 0
+        self.inode = stat.st_ino
+        self._file = handle
+        self._file.seek(self.offset)
+        return True
+
+    def _close(self):
+        if self._file:
+            self._file.close()
+        self._file = None
+        self._skipping = False
+
+    def _read_lines(self, max_bytes):
+        lines = []
+        start = self.offset
+        while self.offset - start < max_bytes:
+            raw = self._file.readline(self.max_line_chars)
+            if not raw:
+                break
+            if not raw.endswith(b"\n"):
+                if len(raw) < self.max_line_chars:
+                    # Line still being written: re-read it whole next time
+                    self._file.seek(self.offset)
+                    break
+                # Oversized line: keep its head, drop the rest up to the next newline
+                self.offset += len(raw)
+                if not self._skipping:
+                    lines.append(raw.decode("utf-8", errors="replace"))
+                self._skipping = True
+                continue
+            self.offset += len(raw)
+            if self._skipping:
+                self._skipping = False
+                continue
+            lines.append(raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+        return lines
+
+    def poll(self, max_bytes=MAX_BYTES_PER_POLL):
+        """Returns the complete lines appended since the last poll."""
+        if self._file is None and not self._open():
+            return []
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None and stat.st_ino == self.inode:
+            if stat.st_size < self.offset:
+                print(f"🔄 {self.path} was truncated, reading it from the start")
+                self.offset = 0
+                self._file.seek(0)
+                self._skipping = False
+            return self._read_lines(max_bytes)
+
+        # Rotated or removed: drain what was appended to the old file first
+        lines = self._read_lines(max_bytes)
+        if not lines and stat is not None:
+            print(f"🔄 {self.path} was rotated, following the new file")
+            self._close()
+            # The file now at the path is new: all of it is unread
+            self.offset = 0
+            self.inode = stat.st_ino
+            if self._open():
+                lines = self._read_lines(max_bytes)
+        return lines
+
+    def state(self):
+        return {"offset": self.offset, "inode": self.inode}
+
+    def close(self):
+        self._close()
+
+
+class LogFollower:
+    """
+    Tails log files and triages new lines incrementally. An analysis of the lines gathered
+    since the previous one is started when a never-seen ERROR/FATAL template appears or the
+    event rate crosses FOLLOW_RATE_THRESHOLD, after FOLLOW_DEBOUNCE_SECONDS and no sooner
+    than FOLLOW_COOLDOWN_SECONDS after the previous analysis. Events that trigger nothing
+    within FOLLOW_WINDOW_SECONDS are dropped. Known templates and the offsets up to which
+    lines were handed to an analysis (or dropped) are persisted, so a restart re-reads the
+    lines of a pending window instead of losing them.
+    """
+
+    def __init__(self, paths, analyze, state_path=FOLLOW_STATE_PATH, rate_threshold=FOLLOW_RATE_THRESHOLD,
+                 debounce_seconds=FOLLOW_DEBOUNCE_SECONDS, cooldown_seconds=FOLLOW_COOLDOWN_SECONDS,
+                 window_seconds=FOLLOW_WINDOW_SECONDS):
+        self.analyze = analyze
+        self.state_path = state_path
+        self.rate_threshold = rate_threshold
+        self.debounce_seconds = debounce_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.window_seconds = window_seconds
+
+        state = self._load_state()
+        self.known_templates = set(state.get("known_templates", []))
+        self.committed_files = state.get("files", {})
+        self.files = [FollowedFile(os.path.abspath(p), **self.committed_files.get(os.path.abspath(p), {}))
+                      for p in paths]
+        self.window = LogTriage()
+        self.window_started_at = None
+        self.recent_events = deque()  # (time, events) per poll, for the rate over the last minute
+        self.trigger_reason = None
+        self.triggered_at = None
+        self.last_analysis_at = None
+        self._analysis = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._state_saved_at = 0
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_state(self):
+        if os.path.dirname(self.state_path):
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        state = {"files": self.committed_files,
+                 "known_templates": sorted(self.known_templates)[:MAX_KNOWN_TEMPLATES]}
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+        self._state_saved_at = time.time()
+
+    def _commit_offsets(self):
+        # Every line before the current offsets is analyzed, being analyzed or deliberately dropped
+        self.committed_files = {f.path: f.state() for f in self.files if f.offset is not None}
+
+    def _reset_window(self):
+        self.window = LogTriage()
+        self.window_started_at = None
+        self._commit_offsets()
+
+    def event_rate(self, now):
+        while self.recent_events and now - self.recent_events[0][0] > 60:
+            self.recent_events.popleft()
+        return sum(events for _, events in self.recent_events)
+
+    def poll_once(self, now=None):
+        """Reads new lines of every file into the window triage and checks the triggers."""
+        now = now or time.time()
+        if (self.trigger_reason is None and self.window_started_at is not None
+                and now - self.window_started_at > self.window_seconds):
+            print(f"🧹 Dropping {self.window.event_count} events that triggered no analysis "
+                  f"in {self.window_seconds:.0f}s")
+            self._reset_window()
+        events_before = self.window.event_count
+        for followed in self.files:
+            for line in followed.poll():
+                self.window.add_line(line)
+            # Events never span files (a trace in one file must not attach to another's error)
+            self.window.flush()
+        self.recent_events.append((now, self.window.event_count - events_before))
+        if not self.window.event_count:
+            self._commit_offsets()
+        elif self.window_started_at is None:
+            self.window_started_at = now
+
+        if self.trigger_reason is None:
+            new_templates = [t for t, c in self.window.clusters.items()
+                             if c["level"] in ("FATAL", "ERROR") and t not in self.known_templates]
+            rate = self.event_rate(now)
+            if new_templates:
+                self.trigger_reason = f"new error template: {new_templates[0][:120]}"
+            elif self.rate_threshold and rate >= self.rate_threshold:
+                self.trigger_reason = f"{rate} events in the last minute"
+            if self.trigger_reason:
+                self.triggered_at = now
+                print(f"🚨 Trigger ({self.trigger_reason}), analyzing in {self.debounce_seconds:.0f}s")
+
+        if self.trigger_reason and self._ready(now):
+            self._start_analysis(now)
+        if now - self._state_saved_at >= STATE_SAVE_SECONDS:
+            self.save_state()
+
+    def _ready(self, now):
+        if self._analysis is not None and not self._analysis.done():
+            return False
+        if now - self.triggered_at < self.debounce_seconds:
+            return False
+        return self.last_analysis_at is None or now - self.last_analysis_at >= self.cooldown_seconds
+
+    def _start_analysis(self, now):
+        window = self.window
+        if not window.event_count:
+            self.trigger_reason = None
+            return
+        self.known_templates.update(t for t, c in window.clusters.items() if c["level"] in ("FATAL", "ERROR"))
+        print(f"🔍 Analyzing {window.event_count} events in {len(window.clusters)} templates "
+              f"({self.trigger_reason})")
+        self._reset_window()
+        self.trigger_reason = None
+        self.triggered_at = None
+        self.last_analysis_at = now
+        # The analyzed events must not count towards the next rate trigger
+        self.recent_events.clear()
+        self._analysis = self._executor.submit(self._run_analysis, window)
+
+    def _run_analysis(self, window):
+        try:
+            return self.analyze(window)
+        except Exception as e:
+            print(f"❌ Follow-mode analysis failed: {e}")
+
+    def run(self, poll_seconds=FOLLOW_POLL_SECONDS):
+        print(f"👀 Following {len(self.files)} file(s); Ctrl+C to stop.")
+        try:
+            while True:
+                started = time.time()
+                self.poll_once(started)
+                time.sleep(max(0.0, poll_seconds - (time.time() - started)))
+        except KeyboardInterrupt:
+            print("👋 Stopping follow mode.")
+        finally:
+            self.save_state()
+            for followed in self.files:
+                followed.close()
+            self._executor.shutdown(wait=True)
+
+
+def follow_logs(paths):
+    from orchestrator import orchestrator
+    LogFollower(paths, orchestrator).run()
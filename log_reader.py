@@ -0,0 +1,32 @@
+import re
+
+# Lines worth sending to the LLM (see log_triage).
+ERROR_PATTERN = re.compile(
+    r"\b(error|exception|fail(ed|ure)?|fatal|critical|warn(ing)?|timeout|timed out|deadlock|traceback)\b",
+    re.IGNORECASE,
+)
+# Stack trace / continuation lines that belong to the previous error line.
+CONTINUATION_PATTERN = re.compile(r"^(\s+|at\s|Caused by|---)")
+
+DEFAULT_MAX_LINE_CHARS = 4096
+
+
+def iter_log_lines(file_path, max_line_chars=DEFAULT_MAX_LINE_CHARS):
+    """
+    Yields decoded lines from a log file using buffered reads.
+    Very long lines are truncated to max_line_chars so a single runaway line
+    can never be loaded into memory in full.
+    """
+    with open(file_path, "rb") as f:
+        while True:
+            raw = f.readline(max_line_chars)
+            if not raw:
+                break
+            if not raw.endswith(b"\n"):
+                # Skip the remainder of an oversized line.
+                while True:
+                    rest = f.readline(max_line_chars)
+                    if not rest or rest.endswith(b"\n"):
+                        break
+            yield raw.decode("utf-8", errors="replace").rstrip("\r\n")
+
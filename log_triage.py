@@ -0,0 +1,170 @@
+import re
+from log_reader import ERROR_PATTERN, CONTINUATION_PATTERN, iter_log_lines
+
+# Variable tokens masked out of a line to form its template. Order matters:
+# the more specific patterns must run before the generic number mask.
+MASK_PATTERNS = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<TS>"),
+    (re.compile(r"\b\d{1,4}[/-]\d{1,2}[/-]\d{1,4}\b"), "<DATE>"),
+    (re.compile(r"\b\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\b"), "<TIME>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<GUID>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<IP>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<HEX>"),
+    (re.compile(r"\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{12,}\b"), "<HEX>"),
+    (re.compile(r"(?<![A-Za-z_])[-+]?\d+(?:\.\d+)?"), "<NUM>"),
+]
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+LEVEL_PATTERNS = [
+    ("FATAL", re.compile(r"\b(fatal|critical|panic)\b", re.IGNORECASE)),
+    ("ERROR", re.compile(r"\b(error|exception|fail(ed|ure)?|traceback|deadlock)\b", re.IGNORECASE)),
+    ("WARN", re.compile(r"\b(warn(ing)?|timeout|timed out)\b", re.IGNORECASE)),
+]
+
+MAX_TEMPLATE_CHARS = 500
+MAX_SAMPLE_CHARS = 1500
+
+
+def mask_line(line):
+    """Replaces ids, timestamps, GUIDs and numbers with placeholders to get the line's template."""
+    template = line[:MAX_TEMPLATE_CHARS]
+    for pattern, placeholder in MASK_PATTERNS:
+        template = pattern.sub(placeholder, template)
+    return WHITESPACE_PATTERN.sub(" ", template).strip()
+
+
+def line_level(line):
+    for level, pattern in LEVEL_PATTERNS:
+        if pattern.search(line):
+            return level
+    return "INFO"
+
+
+class LogTriage:
+    """
+    Streams log lines, keeps only error/warning events and clusters them by template.
+    Each cluster keeps a count, its first/last line number and a few sample events,
+    so memory is bounded by the number of distinct templates, not the log size.
+    """
+
+    def __init__(self, max_templates=5000, samples_per_template=2, max_trace_lines=8):
+        self.max_templates = max_templates
+        self.samples_per_template = samples_per_template
+        self.max_trace_lines = max_trace_lines
+        self.clusters = {}
+        self.total_lines = 0
+        self.event_count = 0
+        self.overflow_count = 0
+        self._current = None
+        self._current_line_no = 0
+
+    def add_line(self, line):
+        self.total_lines += 1
+        if ERROR_PATTERN.search(line):
+            self._close_event()
+            self._current = [line]
+            self._current_line_no = self.total_lines
+        elif self._current is not None and line and CONTINUATION_PATTERN.match(line):
+            if len(self._current) < self.max_trace_lines:
+                self._current.append(line)
+        else:
+            self._close_event()
+
+    def feed(self, lines):
+        for line in lines:
+            self.add_line(line)
+        self.flush()
+        return self
+
+    def flush(self):
+        """Closes the pending event (its stack trace may still be growing when tailing a live log)."""
+        self._close_event()
+
+    def _close_event(self):
+        if self._current is None:
+            return
+        event = self._current
+        self._current = None
+        self.event_count += 1
+
+        template = mask_line(event[0])
+        cluster = self.clusters.get(template)
+        if cluster is None:
+            if len(self.clusters) >= self.max_templates:
+                self.overflow_count += 1
+                return
+            cluster = {
+                "template": template,
+                "level": line_level(event[0]),
+                "count": 0,
+                "first_line": self._current_line_no,
+                "last_line": self._current_line_no,
+                "samples": [],
+            }
+            self.clusters[template] = cluster
+        cluster["count"] += 1
+        cluster["last_line"] = self._current_line_no
+        sample = "\n".join(event)[:MAX_SAMPLE_CHARS]
+        if len(cluster["samples"]) < self.samples_per_template and sample not in cluster["samples"]:
+            cluster["samples"].append(sample)
+
+    def merge(self, other):
+        """
+        Adds another triage's clusters and counts to this one (e.g. the same incident seen in
+        several files). Line numbers of clusters already present refer to this triage's log.
+        """
+        self.total_lines += other.total_lines
+        self.event_count += other.event_count
+        self.overflow_count += other.overflow_count
+        for template, theirs in other.clusters.items():
+            cluster = self.clusters.get(template)
+            if cluster is None:
+                if len(self.clusters) >= self.max_templates:
+                    self.overflow_count += theirs["count"]
+                    continue
+                self.clusters[template] = {**theirs, "samples": list(theirs["samples"])}
+                continue
+            cluster["count"] += theirs["count"]
+            for sample in theirs["samples"]:
+                if len(cluster["samples"]) < self.samples_per_template and sample not in cluster["samples"]:
+                    cluster["samples"].append(sample)
+        return self
+
+    def templates(self):
+        """Clusters ordered by severity, then by number of occurrences."""
+        severity = {"FATAL": 0, "ERROR": 1, "WARN": 2, "INFO": 3}
+        return sorted(self.clusters.values(), key=lambda c: (severity[c["level"]], -c["count"]))
+
+    def render(self, max_templates=40, max_chars=16000):
+        """Compact text report (templates, counts and samples) to send to the LLM."""
+        templates = self.templates()
+        lines = [
+            f"Scanned {self.total_lines} log lines: {self.event_count} error/warning events "
+            f"in {len(templates)} distinct templates."
+        ]
+        size = len(lines[0])
+        shown = 0
+        for cluster in templates[:max_templates]:
+            block = [
+                f"\n[{cluster['level']}] x{cluster['count']} "
+                f"(lines {cluster['first_line']}-{cluster['last_line']}): {cluster['template']}"
+            ]
+            for sample in cluster["samples"]:
+                block.append("  sample: " + sample.replace("\n", "\n          "))
+            block_text = "\n".join(block)
+            if shown and size + len(block_text) > max_chars:
+                break
+            lines.append(block_text)
+            size += len(block_text)
+            shown += 1
+
+        hidden = templates[shown:]
+        if hidden or self.overflow_count:
+            hidden_events = sum(c["count"] for c in hidden) + self.overflow_count
+            lines.append(f"\n... {len(hidden)} more templates ({hidden_events} events) not shown.")
+        return "\n".join(lines)
+
+
+def triage_log_file(file_path, **kwargs):
+    """Runs the triage stage over a log file in a single streaming pass."""
+    return LogTriage(**kwargs).feed(iter_log_lines(file_path))
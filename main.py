@@ -1,4 +1,5 @@
 from orchestrator import orchestrator
+from log_triage import triage_log_file
 import sys
 import os
 
@@ -8,18 +9,46 @@ if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("❌ Please provide the log file path as an argument.")
         print("Usage: python main.py <log_file_path>")
+        print("       python main.py --batch <log_dir|glob>")
+        print("       python main.py --follow <log_file> [<log_file> ...]")
+        print("       python main.py --serve [--host HOST] [--port PORT] [--workers N] [--queue-size N]")
         sys.exit(1)
 
+    if sys.argv[1] == "--serve":
+        # Long-running mode: warm clients, HTTP job API (see service.py)
+        from service import main as serve_main
+        serve_main(sys.argv[2:])
+        sys.exit(0)
+
+    if sys.argv[1] == "--batch":
+        if len(sys.argv) < 3:
+            print("❌ Please provide a directory or glob pattern of log files.")
+            sys.exit(1)
+        # Many logs: parallel triage, one analysis per distinct incident, one consolidated report
+        from batch import run_batch
+        run_batch(sys.argv[2])
+        sys.exit(0)
+
+    if sys.argv[1] == "--follow":
+        if len(sys.argv) < 3:
+            print("❌ Please provide the log file(s) to follow.")
+            sys.exit(1)
+        # Continuous mode: tail the files and analyze only new incidents (see log_follow.py)
+        from log_follow import follow_logs
+        follow_logs(sys.argv[2:])
+        sys.exit(0)
+
     file_path = sys.argv[1]
 
     if not os.path.isfile(file_path):
         print(f"❌ File not found: {file_path}")
         sys.exit(1)
 
-    # Read file content
-    with open(file_path, 'r', encoding='utf-8') as f:
-        print(f"📂 Reading log file: {file_path}")
-        user_input = f.read()
+    # Stream the file once, keeping only clustered error templates instead of the raw log
+    print(f"📂 Reading log file: {file_path}")
+    user_input = triage_log_file(file_path)
+    print(f"🧹 Triage: {user_input.event_count} error/warning events in {len(user_input.clusters)} templates "
+          f"({user_input.total_lines} lines scanned)\n")
     print("🔍 Analyzing logs and generating JIRA ticket...\n")
     result = orchestrator(user_input)
 
@@ -2,161 +2,313 @@ from agents.log_agent import log_agent
 from agents.code_agent import code_agent
 from agents.db_agent import db_agent
 from agents.decision_agent import decision_agent
-from agents.jira_agent import jira_agent
+from agents.jira_agent import jira_agent, jira_add_occurrence
 import os
 import json
-from openai import OpenAI
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
-from reportlab.lib.units import inch
-from textwrap import wrap
+import uuid
 import re
 from datetime import datetime
-from jira import JIRA
+from pipeline import Step, run_pipeline, print_timings
+from llm_client import LLMError
+from llm_cache import get_llm_cache
+from code_index import retrieve_relevant_code
+from report import generate_report, report_file_name
+from tracing import start_trace, span, print_trace_summary
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from log_triage import LogTriage
+from incident_index import get_incident_index, triage_signature, summary_signature, fingerprint
+from incident_kb import get_incident_kb, reusable
 
-client = OpenAI(api_key="your_api_key")  # Replace with your API key
+# Per-step timeouts in seconds
+STEP_TIMEOUTS = {
+    "log": 600,
+    "decision": 120,
+    "code": 600,
+    "db": 1200,
+    "report": 120,
+    "jira": 600,
+}
+DB_CONN_STR = os.getenv("DB_CONN_STR", "DRIVER={ODBC Driver 17 for SQL Server};SERVER=localhost;DATABASE=Test;UID=sa;PWD=titan#12")
+JIRA_SERVER = os.getenv("JIRA_SERVER", "https://jira-stg.csod.com")
+# Repeats of a known incident comment on its existing JIRA issue instead of running the pipeline
+JIRA_DEDUP = os.getenv("JIRA_DEDUP", "true").lower() == "true"
+# DB diagnostics can use the code analysis, but waiting for it serializes the two agents.
+DB_WAITS_FOR_CODE = os.getenv("DB_WAITS_FOR_CODE", "false").lower() == "true"
+# Build the report alongside the JIRA ticket instead of before it; the upload waits for it
+REPORT_BACKGROUND = os.getenv("REPORT_BACKGROUND", "false").lower() == "true"
+
+
+def parse_decision(decision_text):
+    decision_text_clean = re.sub(r"```(?:json)?|```", "", decision_text).strip()
+    try:
+        return json.loads(decision_text_clean)
+    except json.JSONDecodeError:
+        return {"run_code_agent": False, "run_db_agent": False, "reason": "Failed to parse decision"}
+
+
+# Collect all finished files from the current output folder (".part" files are still being written)
+def collect_output_files(output_dir):
+    files = []
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                files.extend(collect_output_files(entry.path))
+            elif entry.is_file() and not entry.name.endswith(".part"):
+                files.append(entry.path)
+    return sorted(files)
+
+
+def jira_credentials():
+    return {"server": JIRA_SERVER, "username": os.getenv("USER"), "password": os.getenv("PASS")}
+
+
+def report_repeat(incident_fingerprint, details, signature=""):
+    """
+    Claims the incident for this run, or records the occurrence on the incident that already
+    holds it. Returns None when this run should analyze it, else {"issue_key", "occurrences"}
+    (issue_key is None while another run is still analyzing it).
+    """
+    incidents = get_incident_index()
+    known = incidents.claim(incident_fingerprint, signature)
+    if not known:
+        return None
+    if not known["issue_key"]:
+        occurrences = incidents.record_repeat(incident_fingerprint)
+        print(f"⏳ Incident {incident_fingerprint[:12]} is being analyzed by another run (occurrence #{occurrences})")
+        return {"issue_key": None, "occurrences": occurrences}
+    occurrences = known["occurrences"] + 1
+    print(f"🔁 Known incident {incident_fingerprint[:12]} -> {known['issue_key']} (occurrence #{occurrences})")
+    issue_key = jira_add_occurrence({**jira_credentials(), "issue_key": known["issue_key"],
+                                     "occurrences": occurrences, "details": details})
+    # Only counted once the comment is on the issue
+    incidents.record_repeat(incident_fingerprint)
+    return {"issue_key": issue_key, "occurrences": occurrences}
 
 
 def orchestrator(user_input):
     print("🤖 Orchestrator: Coordinating agents...\n")
-    output_dir = "output\\analysis_{timestamp}".format(timestamp=datetime.now().strftime("%Y%m%d_%H%M%S"))
-    os.makedirs(output_dir, exist_ok=True) 
+    with start_trace("orchestrator") as trace:
+        return orchestrate(user_input, trace)
+
+
+def orchestrate(user_input, trace):
+
+    # A triaged log has a deterministic error signature: a repeat of a known incident
+    # short-circuits the whole pipeline before any LLM call
+    incident_fingerprint = None
+    signature = ""
+    # Fingerprints this run claimed; released at the end unless a ticket was recorded for them
+    claimed = []
+    if isinstance(user_input, LogTriage) and user_input.clusters:
+        signature = triage_signature(user_input)
+        incident_fingerprint = fingerprint(signature)
+        if JIRA_DEDUP:
+            try:
+                repeat = report_repeat(incident_fingerprint, user_input.render(max_templates=10, max_chars=4000),
+                                       signature)
+                if repeat is None:
+                    claimed.append(incident_fingerprint)
+            except Exception as e:
+                print(f"⚠️ Could not update the known incident, running the full analysis: {e}")
+                repeat = None
+            if repeat:
+                print_trace_summary(trace)
+                return {"log_summary": None, "decision": None, "code_analysis": None, "db_result": None,
+                        "jira_ticket": repeat["issue_key"], "report_path": None, "duplicate_of": repeat["issue_key"],
+                        "fingerprint": incident_fingerprint, "timings": {}, "trace_path": None}
+
+    # Short random suffix: concurrent runs (service mode) can start within the same second
+    output_dir = os.path.join("output", "analysis_{timestamp}_{run_id}".format(
+        timestamp=datetime.now().strftime("%Y%m%d_%H%M%S"), run_id=uuid.uuid4().hex[:6]))
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_path = os.path.join(output_dir, report_file_name(timestamp))
+    report_done = Future()
+
     # Step 1: Run Log Agent
-    log_summary = log_agent(user_input)
-    print("🔍 Log Summary Generated:\n", log_summary)
-    print("🤖 Log Agent completed.\n")
+    def run_log(results):
+        log_summary = log_agent(user_input)
+        print("🔍 Log Summary Generated:\n", log_summary)
+        print("🤖 Log Agent completed.\n")
+        return log_summary
 
-    # Step 2: Use Decision Agent
-    decision_text = decision_agent(log_summary)
-    decision_text_clean = re.sub(r"```(?:json)?|```", "", decision_text).strip()
-    print("🤖 LLM Decision:\n", decision_text)
-    print("🤖 Decision-making completed.\n")
+    # Without a triage signature, dedup on the normalized log summary instead
+    def run_dedup(results):
+        if incident_fingerprint or not JIRA_DEDUP:
+            return None
+        summary_fingerprint = fingerprint(summary_signature(results["log"]))
+        repeat = report_repeat(summary_fingerprint, results["log"], summary_signature(results["log"]))
+        if repeat is None:
+            claimed.append(summary_fingerprint)
+        return repeat
 
-    try:
-        decision = json.loads(decision_text)
-    except json.JSONDecodeError:
-        decision = {"run_code_agent": False, "run_db_agent": False, "reason": "Failed to parse decision"}
+    # Past incidents close to this one: a close match is passed to the code and DB agents as a hint,
+    # a near-identical one (see incident_kb.reusable) replaces the code analysis and DB drill-down
+    def run_kb(results):
+        try:
+            kb = get_incident_kb()
+            match = kb.best_match(signature or summary_signature(results["log"]), results["log"]) if kb else None
+        except Exception as e:
+            print(f"⚠️ Incident knowledge base unavailable: {e}")
+            return None
+        if match:
+            match["reuse"] = reusable(match)
+            print(f"📚 Similar past incident #{match['id']} (score {match['score']:.2f}, "
+                  f"JIRA {match.get('jira_key') or 'none'}){', reusing its analysis' if match['reuse'] else ''}")
+        return match
 
-    print (decision.get("run_code_agent"), decision.get("run_db_agent"))
-    # Step 3: Execute agents
-    code_analysis = None
-    db_result = None
-    jira_ticket = None
+    # Step 2: Use Decision Agent
+    def run_decision(results):
+        decision_text = decision_agent(results["log"])
+        print("🤖 LLM Decision:\n", decision_text)
+        print("🤖 Decision-making completed.\n")
+        decision = parse_decision(decision_text)
+        print(decision.get("run_code_agent"), decision.get("run_db_agent"))
+        return decision
 
+    # Step 3: Code and DB agents only depend on the log summary and run concurrently
+    def similar_incident(results):
+        match = results.get("kb")
+        return get_incident_kb().document(match["id"], match) if match else None
 
-    if decision.get("run_code_agent"):
+    def run_code(results):
+        match = results.get("kb")
+        if match and match["reuse"] and match.get("code_analysis"):
+            print(f"♻️ Reusing the code analysis of incident #{match['id']}")
+            return (f"Same root cause as past incident #{match['id']} (JIRA {match.get('jira_key') or 'none'}, "
+                    f"similarity {match['score']:.2f}):\n{match['code_analysis']}")
         print("💻 Running Code Agent...")
-        project_path = "C:\hack"
-        source_code = collect_project_source_code(project_path)
-        code_analysis = code_agent(log_summary, source_code)
+        project_path = os.getenv("PROJECT_PATH", "C:\\hack")
+        # Only the indexed code chunks relevant to the log summary go into the prompt
+        with span("code.retrieve", kind="retrieval") as retrieval_span:
+            source_code = retrieve_relevant_code(project_path, results["log"])
+            retrieval_span.set(prompt_chars=len(source_code))
+        code_analysis = code_agent(results["log"], source_code, similar_incident(results))
         print("💻 Code Analysis Generated:\n", code_analysis)
         print("✅ Code Analysis Completed.")
+        return code_analysis
 
-    if decision.get("run_db_agent"):
+    def run_db(results):
         print("🛢️ Running DB Agent...")
+        match = results.get("kb")
         db_result = db_agent({
-            "log_summary": log_summary,
-            "code_analysis": code_analysis or "",
-            "db_conn_str": "DRIVER={ODBC Driver 17 for SQL Server};SERVER=localhost;DATABASE=Test;UID=sa;PWD=titan#12",
-            "log_file": f"{output_dir}\\db_agent.log",
-            "output_dir": output_dir
+            "log_summary": results["log"],
+            "code_analysis": results.get("code") or "",
+            "decision": results["decision"],
+            "db_conn_str": DB_CONN_STR,
+            "log_file": os.path.join(output_dir, "db_agent.log"),
+            "output_dir": output_dir,
+            "similar_incident": similar_incident(results),
+            # Canned diagnostics still check the current state; the LLM drill-down is what gets skipped
+            **({"max_llm_steps": 0} if match and match["reuse"] else {})
         })
-
         print("🛢️ DB Analysis Result:\n", db_result)
         print("✅ DB Analysis Completed.")
+        return db_result
 
-        # Step 5: Generate Report
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_path = f"{output_dir}\\analysis_report_{timestamp}.pdf"
-    generate_pdf_report(report_path, log_summary, decision, code_analysis, db_result, jira_ticket)
-    print(f"📄 Report generated: {report_path}")
-
-    # Step 6: Generate JIRA Ticket
-    print("📝 Creating JIRA ticket...")
-    jira_server = "https://jira-stg.csod.com"
-    jira_username = os.getenv("USER")
-    jira_password = os.getenv("PASS")
-
-    # Collect all files from the current output folder
-    def collect_output_files(output_dir):
-        files = []
-        for root, _, file_names in os.walk(output_dir):
-            for f in file_names:
-                file_path = os.path.join(root, f)
-                if os.path.isfile(file_path):
-                    files.append(file_path)
-        return files
-
-    attachments = collect_output_files(output_dir)
-
-    jira_ticket = jira_agent({
-        "server": jira_server,
-        "username": jira_username,
-        "password": jira_password,
-        "log_summary": log_summary,
-        "decision": decision,
-        "code_analysis": code_analysis,
-        "db_result": db_result,
-        "attachments": attachments
-    })
-    print("📝 JIRA Ticket Created:\n", jira_ticket)
-    print("✅ JIRA Ticket Completed.")
-
-
+    # Step 4: Generate Report
+    def run_report(results):
+        try:
+            generate_report(report_path, results["log"], results["decision"], results.get("code"), results.get("db"),
+                            None, attachments=collect_output_files(output_dir))
+        finally:
+            report_done.set_result(None)
+        print(f"📄 Report generated: {report_path}")
+        return report_path
 
-    return {
-        "log_summary": log_summary,
-        "decision": decision,
-        "code_analysis": code_analysis,
-        "db_result": db_result,
-        "jira_ticket": jira_ticket,
-        "report_path": report_path
-    }
-
-def collect_project_source_code(project_path, max_size_kb=200):
-    source_code = ""
-    for root, _, files in os.walk(project_path):
-        for file in files:
-            if not file.endswith((".py", ".cs", ".js", ".ts")):
-                continue
-            file_path = os.path.join(root, file)
+    def report_attachments():
+        if REPORT_BACKGROUND:
             try:
-                if os.path.getsize(file_path) > max_size_kb * 1024:
-                    continue
-                with open(file_path, "r", encoding="utf-8") as f:
-                    source_code += f"\n# File: {file_path}\n"
-                    source_code += f.read() + "\n"
-            except (UnicodeDecodeError, PermissionError, IsADirectoryError):
-                continue
-    return source_code
-
-def generate_pdf_report(output_path, log_summary, decision, code_analysis, db_result, jira_ticket=None):
-    doc = SimpleDocTemplate(output_path, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
+                report_done.result(timeout=STEP_TIMEOUTS["report"])
+            except FutureTimeoutError:
+                print("⚠️ Report not ready, creating the ticket without it.")
+        return collect_output_files(output_dir)
 
-    def add_section(title, content, style="Heading2", space_after=0.2):
-        story.append(Paragraph(f"<b>{title}</b>", styles[style]))
-        story.append(Spacer(1, space_after * inch))
-        if isinstance(content, dict) or isinstance(content, list):
-            pretty = json.dumps(content, indent=2)
-            for line in pretty.splitlines():
-                story.append(Paragraph(line, styles["Code"]))
-        else:
-            for para in str(content).split("\n"):
-                story.append(Paragraph(para, styles["Normal"]))
-        story.append(Spacer(1, 0.3 * inch))
+    # Step 5: Generate JIRA Ticket
+    def run_jira(results):
+        print("📝 Creating JIRA ticket...")
+        jira_ticket = jira_agent({
+            **jira_credentials(),
+            "log_summary": results["log"],
+            "decision": results["decision"],
+            "code_analysis": results.get("code"),
+            "db_result": results.get("db"),
+            "attachments": report_attachments
+        })
+        print("📝 JIRA Ticket Created:\n", jira_ticket)
+        print("✅ JIRA Ticket Completed.")
+        return jira_ticket
 
-    add_section("📌 Log Summary", log_summary)
-    add_section("🤖 Decision", decision)
-    add_section("💻 Code Analysis", code_analysis if code_analysis else "Not Executed")
-    add_section("🛢️ DB Analysis", db_result if db_result else "Not Executed")
-    add_section("📝 JIRA Ticket", jira_ticket if jira_ticket else "Not Created")
+    steps = [
+        Step("log", run_log, timeout=STEP_TIMEOUTS["log"]),
+        Step("dedup", run_dedup, deps=["log"], timeout=STEP_TIMEOUTS["jira"]),
+        Step("decision", run_decision, deps=["log", "dedup"], timeout=STEP_TIMEOUTS["decision"],
+             run_on_failure=True, condition=lambda r: r.get("log") is not None and r.get("dedup") is None),
+        Step("kb", run_kb, deps=["log", "dedup"], timeout=STEP_TIMEOUTS["decision"],
+             run_on_failure=True, condition=lambda r: r.get("log") is not None and r.get("dedup") is None),
+        # A failed kb lookup must not block the agents: the conditions check the decision
+        Step("code", run_code, deps=["decision", "kb"], timeout=STEP_TIMEOUTS["code"], run_on_failure=True,
+             condition=lambda r: bool(r["decision"] and r["decision"].get("run_code_agent"))),
+        Step("db", run_db, deps=["decision", "kb", "code"] if DB_WAITS_FOR_CODE else ["decision", "kb"],
+             timeout=STEP_TIMEOUTS["db"], run_on_failure=True,
+             condition=lambda r: bool(r["decision"] and r["decision"].get("run_db_agent"))),
+        Step("report", run_report, deps=["decision", "code", "db"], timeout=STEP_TIMEOUTS["report"],
+             run_on_failure=True, condition=lambda r: r.get("decision") is not None),
+        Step("jira", run_jira, deps=["decision", "code", "db"] if REPORT_BACKGROUND else ["report"],
+             timeout=STEP_TIMEOUTS["jira"],
+             run_on_failure=True, condition=lambda r: r.get("decision") is not None),
+    ]
+    # Without the LLM there is nothing to report: steps after a failed LLM call are skipped
+    results, timings = run_pipeline(steps, fatal=(LLMError,))
+    print_timings(timings)
+    llm_failed = any(timing["fatal"] for timing in timings.values())
+    if results.get("jira") and not llm_failed:
+        new_signature = signature or summary_signature(results["log"])
+        get_incident_index().record_new(fingerprint(new_signature), results["jira"], new_signature)
+    else:
+        # A run cut short by an LLM outage must not pin the incident to whatever it produced
+        for claimed_fingerprint in claimed:
+            get_incident_index().release(claimed_fingerprint)
+    cache = get_llm_cache()
+    if cache:
+        print(f"💾 LLM cache: {cache.hits} hits, {cache.misses} misses")
+    if results.get("decision") is not None and not llm_failed:
+        record_incident(results, signature, trace)
+    print_trace_summary(trace)
+    trace_path = trace.export(os.path.join(output_dir, "run_trace.json"))
+    print(f"🔎 Run trace written to {trace_path}")
 
-    doc.build(story)
+    return {
+        "log_summary": results.get("log"),
+        "decision": results.get("decision"),
+        "code_analysis": results.get("code"),
+        "db_result": results.get("db"),
+        "jira_ticket": results.get("jira") or (results.get("dedup") or {}).get("issue_key"),
+        "report_path": results.get("report"),
+        "duplicate_of": (results.get("dedup") or {}).get("issue_key"),
+        "fingerprint": incident_fingerprint,
+        "timings": timings,
+        "trace_path": trace_path
+    }
 
+def record_incident(results, signature, trace):
+    """Stores the completed analysis in the incident knowledge base for future runs."""
+    kb = get_incident_kb()
+    if kb is None:
+        return
+    signature = signature or summary_signature(results["log"])
+    sql_queries = [s.attributes["sql"] for s in trace.spans if s.kind == "sql" and s.attributes.get("sql")]
+    try:
+        incident_id = kb.add({
+            "fingerprint": fingerprint(signature), "signature": signature, "log_summary": results["log"],
+            "decision": results["decision"], "code_analysis": results.get("code"), "db_result": results.get("db"),
+            "sql_queries": sql_queries, "jira_key": results.get("jira"),
+        })
+        print(f"📚 Stored as incident #{incident_id} in the knowledge base")
+    except Exception as e:
+        print(f"⚠️ Could not store the incident in the knowledge base: {e}")
 
 
+def generate_pdf_report(output_path, log_summary, decision, code_analysis, db_result, jira_ticket=None):
+    return generate_report(output_path, log_summary, decision, code_analysis, db_result, jira_ticket,
+                           report_format="pdf")
@@ -0,0 +1,166 @@
+import time
+import threading
+import contextvars
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+from tracing import span, bind
+
+# Set when the running step timed out; see check_cancelled()
+_cancel_event = contextvars.ContextVar("pipeline_cancel_event", default=None)
+
+
+class StepCancelled(BaseException):
+    """
+    Raised by check_cancelled() in a step that timed out. A BaseException like
+    asyncio.CancelledError, so the agents' broad "except Exception" handlers let it through.
+    """
+
+
+def cancelled():
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def check_cancelled():
+    """
+    Threads cannot be killed: a timed-out step keeps running until it calls this. Long
+    steps call it between units of work (LLM calls, SQL statements, result batches).
+    """
+    if cancelled():
+        raise StepCancelled("step timed out")
+
+
+class Step:
+    """
+    One node of the orchestrator's dependency graph.
+    Args:
+        name (str): Unique step name; its result is stored under this key.
+        func (callable): Called with the dict of results computed so far.
+        deps (list): Names of steps that must finish before this one starts.
+        timeout (float): Seconds to wait for the step before giving up on it.
+        condition (callable): Optional predicate on the results; the step is
+            skipped (result None) when it returns False.
+        run_on_failure (bool): Run even if a dependency failed or timed out.
+    """
+
+    def __init__(self, name, func, deps=(), timeout=None, condition=None, run_on_failure=False):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.timeout = timeout
+        self.condition = condition
+        self.run_on_failure = run_on_failure
+
+
+def run_pipeline(steps, max_workers=4, fatal=()):
+    """
+    Runs steps as soon as their dependencies are done, independent steps concurrently.
+    A step failing with one of the fatal exception types skips everything depending on it,
+    run_on_failure or not: its dependents would only work from missing or bogus input.
+    A step that exceeds its timeout is treated as failed and cancelled: its thread stops at
+    its next check_cancelled(). Steps run in daemon threads, so an abandoned step never
+    keeps the process from exiting, and end-to-end latency is bounded by the critical path.
+    Returns:
+        (results, timings): results maps step name -> return value (None if skipped/failed),
+        timings maps step name -> {"status", "seconds", "error", "fatal"}.
+    """
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        for dep in step.deps:
+            if dep not in by_name:
+                raise ValueError(f"Step '{step.name}' depends on unknown step '{dep}'")
+
+    results = {}
+    timings = {}
+    running = {}  # future -> (step, start time, cancel event)
+    waiting = list(steps)
+
+    def finish(step, status, started=None, error=None, is_fatal=False):
+        results.setdefault(step.name, None)
+        timings[step.name] = {
+            "status": status,
+            "seconds": round(time.perf_counter() - started, 3) if started else 0.0,
+            "error": error,
+            "fatal": is_fatal,
+        }
+
+    def run_step(step, step_results, cancel_event):
+        _cancel_event.set(cancel_event)
+        with span(f"step.{step.name}", kind="step"):
+            return step.func(step_results)
+
+    def start(step):
+        future = Future()
+        cancel_event = threading.Event()
+        task = bind(run_step)
+        step_results = dict(results)
+
+        def target():
+            try:
+                future.set_result(task(step, step_results, cancel_event))
+            except BaseException as e:
+                future.set_exception(e)
+
+        # Daemon: the interpreter does not wait for a timed-out step at exit
+        threading.Thread(target=target, name=f"step-{step.name}", daemon=True).start()
+        running[future] = (step, time.perf_counter(), cancel_event)
+
+    try:
+        while waiting or running:
+            # Start every step whose dependencies have all finished.
+            for step in list(waiting):
+                if len(running) >= max_workers:
+                    break
+                if not all(dep in timings for dep in step.deps):
+                    continue
+                waiting.remove(step)
+                failed = [d for d in step.deps if timings[d]["status"] in ("error", "timeout", "skipped_failed")]
+                fatal_deps = [d for d in failed if timings[d]["fatal"]]
+                if fatal_deps:
+                    finish(step, "skipped_failed", error=f"dependency failed: {', '.join(fatal_deps)}", is_fatal=True)
+                    continue
+                if failed and not step.run_on_failure:
+                    finish(step, "skipped_failed", error=f"dependency failed: {', '.join(failed)}")
+                    continue
+                if step.condition and not step.condition(results):
+                    finish(step, "skipped")
+                    continue
+                start(step)
+
+            if not running:
+                if waiting:
+                    raise ValueError("Dependency cycle between steps: " + ", ".join(s.name for s in waiting))
+                break
+
+            now = time.perf_counter()
+            deadlines = [started + step.timeout - now for step, started, _ in running.values() if step.timeout]
+            done, _ = wait(running, timeout=max(min(deadlines), 0) if deadlines else None,
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                step, started, _ = running.pop(future)
+                try:
+                    results[step.name] = future.result()
+                    finish(step, "ok", started)
+                except Exception as e:
+                    print(f"❌ Step '{step.name}' failed: {e}")
+                    finish(step, "error", started, str(e), is_fatal=isinstance(e, fatal))
+
+            now = time.perf_counter()
+            for future, (step, started, cancel_event) in list(running.items()):
+                if step.timeout and now - started >= step.timeout:
+                    running.pop(future)
+                    cancel_event.set()
+                    print(f"⏱️ Step '{step.name}' timed out after {step.timeout}s")
+                    finish(step, "timeout", started, f"timed out after {step.timeout}s")
+    finally:
+        # Pipeline aborted (cycle, KeyboardInterrupt): stop whatever is still running
+        for _, _, cancel_event in running.values():
+            cancel_event.set()
+
+    return results, timings
+
+
+def print_timings(timings):
+    print("⏱️ Step timings:")
+    for name, timing in timings.items():
+        print(f"   {name:<10} {timing['status']:<15} {timing['seconds']:>8.2f}s")
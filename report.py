@@ -0,0 +1,131 @@
+import os
+import json
+import html
+
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "pdf").lower()  # pdf, html or md
+REPORT_SECTION_MAX_CHARS = int(os.getenv("REPORT_SECTION_MAX_CHARS", "20000"))
+REPORT_MAX_LINE_CHARS = 110
+# Lines per PDF paragraph: reportlab lays out and splits a paragraph in time growing with its line count
+REPORT_PARAGRAPH_LINES = 20
+REPORT_EXTENSIONS = {"pdf": "pdf", "html": "html", "md": "md"}
+
+
+def section_text(content, max_chars=REPORT_SECTION_MAX_CHARS, see_also=None):
+    """
+    Returns (text, preformatted) for a section: structured content is pretty-printed JSON,
+    rendered as one preformatted block. Text past max_chars is cut with a pointer to the
+    attached files, so the report size does not grow with the analysis size.
+    """
+    preformatted = isinstance(content, (dict, list))
+    text = json.dumps(content, indent=2, default=str) if preformatted else str(content)
+    if len(text) > max_chars:
+        cut = text.rfind("\n", 0, max_chars)
+        cut = cut if cut > max_chars // 2 else max_chars
+        note = f"\n... [{len(text) - cut} more characters truncated"
+        note += f", see attached {see_also}]" if see_also else "]"
+        text = text[:cut] + note
+    return text, preformatted
+
+
+def build_sections(log_summary, decision, code_analysis, db_result, jira_ticket=None, attachments=()):
+    """The report content as [(title, text, preformatted)], shared by every output format."""
+    result_files = [os.path.basename(p) for p in attachments if p.endswith((".csv", ".csv.gz", ".zip"))]
+    db_see_also = "CSV files" if result_files else None
+    sections = [
+        ("📌 Log Summary", *section_text(log_summary)),
+        ("🤖 Decision", *section_text(decision)),
+        ("💻 Code Analysis", *section_text(code_analysis if code_analysis else "Not Executed")),
+        ("🛢️ DB Analysis", *section_text(db_result if db_result else "Not Executed", see_also=db_see_also)),
+        ("📝 JIRA Ticket", *section_text(jira_ticket if jira_ticket else "Not Created")),
+    ]
+    if result_files:
+        sections.append(("📎 Attached Query Results", "\n".join(result_files), True))
+    return sections
+
+
+def wrap_long_lines(text, width=REPORT_MAX_LINE_CHARS):
+    # Preformatted blocks do not wrap, long SQL or JSON lines would run off the page
+    lines = []
+    for line in text.splitlines():
+        while len(line) > width:
+            lines.append(line[:width])
+            line = "  " + line[width:]
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def write_pdf(output_path, sections, title=None):
+    # reportlab is slow to import and only needed here
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, Preformatted, SimpleDocTemplate, Spacer
+    from reportlab.lib.units import inch
+
+    doc = SimpleDocTemplate(output_path, pagesize=A4)
+    styles = getSampleStyleSheet()
+    story = [Paragraph(html.escape(title), styles["Title"])] if title else []
+    for title, text, preformatted in sections:
+        story.append(Paragraph(f"<b>{html.escape(title)}</b>", styles["Heading2"]))
+        story.append(Spacer(1, 0.2 * inch))
+        if preformatted:
+            # One flowable per section: Preformatted takes plain text and splits across pages
+            story.append(Preformatted(wrap_long_lines(text), styles["Code"]))
+        else:
+            # One paragraph per block of text (or per REPORT_PARAGRAPH_LINES of a long one),
+            # escaped for reportlab's markup
+            for block in text.split("\n\n"):
+                if not block.strip():
+                    continue
+                lines = block.strip().split("\n")
+                for i in range(0, len(lines), REPORT_PARAGRAPH_LINES):
+                    group = "<br/>".join(html.escape(line) for line in lines[i:i + REPORT_PARAGRAPH_LINES])
+                    story.append(Paragraph(group, styles["Normal"]))
+        story.append(Spacer(1, 0.3 * inch))
+    doc.build(story)
+
+
+def write_html(output_path, sections, title="Analysis Report"):
+    parts = [f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>",
+             "<style>body{font-family:sans-serif;max-width:60em;margin:auto}pre{background:#f4f4f4;"
+             "padding:1em;overflow-x:auto}</style></head><body>"]
+    for title, text, preformatted in sections:
+        parts.append(f"<h2>{html.escape(title)}</h2>")
+        if preformatted:
+            parts.append(f"<pre>{html.escape(text)}</pre>")
+        else:
+            parts.extend(f"<p>{html.escape(block.strip())}</p>".replace("\n", "<br>")
+                         for block in text.split("\n\n") if block.strip())
+    parts.append("</body></html>")
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+
+
+def write_markdown(output_path, sections, title="Analysis Report"):
+    parts = [f"# {title}"]
+    for title, text, preformatted in sections:
+        parts.append(f"## {title}")
+        # A fence longer than any backtick run in the text cannot be closed early
+        fence = "`" * max(3, max((len(run.strip()) for run in text.split("\n") if set(run.strip()) == {"`"}), default=0) + 1)
+        parts.append(f"{fence}\n{text}\n{fence}" if preformatted else text)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(parts) + "\n")
+
+
+WRITERS = {"pdf": write_pdf, "html": write_html, "md": write_markdown}
+
+if REPORT_FORMAT not in WRITERS:
+    print(f"⚠️ Unknown REPORT_FORMAT '{REPORT_FORMAT}' (expected {', '.join(WRITERS)}), using pdf.")
+    REPORT_FORMAT = "pdf"
+
+
+def report_file_name(timestamp, report_format=REPORT_FORMAT):
+    return f"analysis_report_{timestamp}.{REPORT_EXTENSIONS[report_format]}"
+
+
+def generate_report(output_path, log_summary, decision, code_analysis, db_result, jira_ticket=None,
+                    attachments=(), report_format=REPORT_FORMAT):
+    sections = build_sections(log_summary, decision, code_analysis, db_result, jira_ticket, attachments)
+    # Renamed when complete, so a step collecting the output directory never attaches a partial report
+    WRITERS[report_format](output_path + ".part", sections)
+    os.replace(output_path + ".part", output_path)
+    return output_path
@@ -0,0 +1,211 @@
+import os
+import json
+import uuid
+import time
+import queue
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from orchestrator import orchestrator, DB_CONN_STR
+from log_triage import LogTriage, triage_log_file
+from llm_client import get_llm_client
+from llm_cache import get_llm_cache
+from vector_db_client import get_embedding_pipeline, get_vector_db
+from db_pool import get_pool
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "2"))
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "100"))
+MAX_JOB_HISTORY = 1000
+MAX_LOG_PAYLOAD_BYTES = 50 * 1024 * 1024
+
+
+class JobQueue:
+    """
+    Bounded queue of analysis jobs processed by a fixed number of worker threads.
+    Job records (status, timings, result or error) are kept in memory for the most
+    recent MAX_JOB_HISTORY jobs; queued and running jobs are never evicted.
+    """
+
+    def __init__(self, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, source, payload):
+        """Queues a job; returns its id, or None when the queue is full."""
+        job = {"id": uuid.uuid4().hex, "status": "queued", "source": source,
+               "submitted_at": time.time(), "started_at": None, "finished_at": None,
+               "result": None, "error": None}
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._evict()
+        try:
+            self._queue.put_nowait((job, payload))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job["id"], None)
+            return None
+        return job["id"]
+
+    def _evict(self):
+        # Oldest finished jobs first; called with the lock held
+        excess = len(self._jobs) - MAX_JOB_HISTORY
+        if excess <= 0:
+            return
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:excess]:
+            del self._jobs[job_id]
+
+    def _update(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self):
+        with self._lock:
+            return [{k: v for k, v in job.items() if k != "result"} for job in self._jobs.values()]
+
+    def stats(self):
+        with self._lock:
+            statuses = [job["status"] for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in ("queued", "running", "done", "failed")}
+
+    def _work(self):
+        while True:
+            job, payload = self._queue.get()
+            self._update(job, status="running", started_at=time.time())
+            try:
+                result = run_job(job["source"], payload)
+                self._update(job, result=result, status="done", finished_at=time.time())
+            except Exception as e:
+                self._update(job, error=str(e), status="failed", finished_at=time.time())
+            finally:
+                with self._lock:
+                    self._evict()
+                self._queue.task_done()
+
+
+def run_job(source, payload):
+    if source == "log_file":
+        triage = triage_log_file(payload)
+    else:
+        triage = LogTriage().feed(payload.splitlines())
+    return orchestrator(triage)
+
+
+def warm_up():
+    """Builds the long-lived clients once so jobs don't pay for them."""
+    print("🔥 Warming up clients...")
+    get_llm_client()
+    get_llm_cache()
+    get_embedding_pipeline()
+    try:
+        print(f"📚 Vector store loaded: {len(get_vector_db())} entries")
+    except Exception as e:
+        print(f"⚠️ Could not load the vector store, jobs will retry: {e}")
+    try:
+        # Opens the first pooled connection (login, session settings) and checks it works
+        with get_pool(DB_CONN_STR).connection() as conn:
+            conn.cursor().execute("SELECT 1").fetchall()
+        print("🛢️ Database connection ready")
+    except Exception as e:
+        print(f"⚠️ Could not open a database connection, jobs will retry: {e}")
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    jobs = None
+
+    def _send(self, status, body):
+        data = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/health":
+            self._send(200, {"status": "ok", "jobs": self.jobs.stats()})
+        elif path == "/jobs":
+            self._send(200, self.jobs.list())
+        elif path.startswith("/jobs/"):
+            job = self.jobs.get(path[len("/jobs/"):])
+            if job:
+                self._send(200, job)
+            else:
+                self._send(404, {"error": "job not found"})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_LOG_PAYLOAD_BYTES:
+            self._send(413, {"error": "payload too large, send a log_file path instead"})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send(400, {"error": "invalid JSON"})
+            return
+
+        if body.get("log_file"):
+            if not os.path.isfile(body["log_file"]):
+                self._send(400, {"error": f"File not found: {body['log_file']}"})
+                return
+            job_id = self.jobs.submit("log_file", body["log_file"])
+        elif body.get("log_text"):
+            job_id = self.jobs.submit("log_text", body["log_text"])
+        else:
+            self._send(400, {"error": "expected 'log_file' or 'log_text'"})
+            return
+
+        if job_id is None:
+            self._send(503, {"error": "job queue is full, retry later"})
+        else:
+            self._send(202, {"id": job_id, "status": "queued"})
+
+    def log_message(self, format, *args):
+        print(f"🌐 {self.address_string()} {format % args}")
+
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS, queue_size=SERVICE_QUEUE_SIZE):
+    warm_up()
+    ServiceHandler.jobs = JobQueue(workers=workers, queue_size=queue_size)
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    print(f"🤖 Analysis service listening on http://{host}:{port} ({workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("👋 Shutting down.")
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Long-running log analysis service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE)
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.queue_size)
+
+
+if __name__ == "__main__":
+    main()
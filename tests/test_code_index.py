@@ -0,0 +1,85 @@
+import os
+import threading
+
+from code_index import CodeIndex
+
+ORDERS = '''
+import logging
+
+RETRY_LIMIT = 3
+
+
+def save_order(order):
+    return write_ledger(order)
+
+
+def cancel_order(order):
+    return None
+'''
+
+
+def make_project(tmp_path):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "orders.py").write_text(ORDERS, encoding="utf-8")
+    (project / "billing.py").write_text("def charge_invoice(invoice):\n    return invoice\n", encoding="utf-8")
+    return project
+
+
+def names(results):
+    return [name for _, _, _, name, _, _ in results]
+
+
+def test_search_ranks_named_chunks_first(tmp_path):
+    index = CodeIndex(str(make_project(tmp_path)), str(tmp_path / "index.sqlite"))
+    index.update()
+
+    results = index.search("Timeout in save_order while calling write_ledger")
+
+    assert names(results)[0] == "save_order"
+    assert "charge_invoice" not in names(results)
+    assert "write_ledger" in index.chunk_text(results[0][1])
+
+
+def test_file_name_matches_every_chunk_of_the_file(tmp_path):
+    index = CodeIndex(str(make_project(tmp_path)), str(tmp_path / "index.sqlite"))
+    index.update()
+
+    assert sorted(names(index.search("Unhandled error in orders.py"))) == ["<module>", "cancel_order", "save_order"]
+
+
+def test_changed_and_removed_files_leave_no_stale_terms(tmp_path):
+    project = make_project(tmp_path)
+    index = CodeIndex(str(project), str(tmp_path / "index.sqlite"))
+    index.update()
+    (project / "orders.py").write_text("def refund_order(order):\n    return order\n", encoding="utf-8")
+    os.utime(project / "orders.py", (1, 1))
+    os.remove(project / "billing.py")
+
+    assert index.update() == 1
+    assert index.search("write_ledger charge_invoice") == []
+    assert names(index.search("refund_order")) == ["refund_order"]
+
+
+def test_concurrent_updates_of_a_new_index(tmp_path):
+    project = make_project(tmp_path)
+    path = str(tmp_path / "index.sqlite")
+    changed, errors = [], []
+
+    def update():
+        try:
+            index = CodeIndex(str(project), path)
+            changed.append(index.update())
+            index.close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=update) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # Serialized: the first update indexes both files, the others find nothing to do
+    assert sorted(changed) == [0, 0, 0, 2]
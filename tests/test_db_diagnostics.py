@@ -0,0 +1,32 @@
+import pytest
+
+from agents.db_diagnostics import select_categories, DEFAULT_CATEGORIES
+
+
+@pytest.mark.parametrize("summary", [
+    "Failed to resolve namespace Contoso.Orders",
+    "Import completed successfully",
+    "IndexOutOfRangeException in OrderParser.Parse",
+    "Unhandled exception in async method: await returned null",
+    "NullReferenceException in ClockService and CodeBlock renderer",
+])
+def test_substrings_of_other_words_do_not_select_categories(summary):
+    assert select_categories(summary) == DEFAULT_CATEGORIES
+
+
+@pytest.mark.parametrize("summary, category", [
+    ("Session 55 was blocked by session 61", "blocking"),
+    ("Lock request time out period exceeded", "blocking"),
+    ("Transaction was deadlocked and chosen as the deadlock victim", "deadlocks"),
+    ("Query is slow and uses a table scan", "missing_indexes"),
+    ("PAGEIOLATCH waits on I/O", "waits"),
+    ("The transaction log for database Orders is full (9002)", "file_growth"),
+    ("Insufficient memory to run this query (701)", "memory"),
+    ("Sort spills to tempdb", "tempdb"),
+])
+def test_whole_words_select_categories(summary, category):
+    assert category in select_categories(summary)
+
+
+def test_decision_reason_is_considered():
+    assert "deadlocks" in select_categories("SqlException 1205", {"reason": "looks like a deadlock"})
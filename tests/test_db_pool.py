@@ -0,0 +1,58 @@
+import pytest
+
+from db_pool import check_sql_allowed, split_statements, mask_sql, UnsafeSQLError
+from agents.db_diagnostics import DIAGNOSTIC_QUERIES
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT '/*' AS a DROP TABLE dbo.Orders SELECT '*/' AS b",
+    "SELECT '--'; DELETE FROM dbo.Orders",
+    "SELECT 1 SELECT 2",
+    "SELECT 1 EXEC sp_who",
+    "SELECT * FROM (SELECT 1 AS x) t SELECT 2",
+    "WITH a AS (SELECT 1 AS x) SELECT * FROM a SELECT 2",
+    "WITH a AS (SELECT 1 AS x) SELECT * FROM a WITH b AS (SELECT 2 AS y) SELECT * FROM b",
+    "EXEC sp_who SELECT 1",
+    "DBCC OPENTRAN DBCC SQLPERF(LOGSPACE)",
+    "SELECT 1 DECLARE @x INT",
+    "SELECT 1 SET ROWCOUNT 0",
+    "SELECT 1\nGO\nSELECT 2",
+    "SELECT 'unterminated",
+    "SELECT 1 /* unterminated",
+    "SELECT 1 /* nested /* comment */ */ DROP TABLE dbo.Orders",
+    "SELECT [a]]b] FROM t; DROP TABLE dbo.Orders",
+    "UPDATE dbo.Orders SET x = 1",
+    "SELECT * INTO dbo.Copy FROM dbo.Orders",
+    "EXEC xp_cmdshell 'dir'",
+    "DBCC SHRINKFILE(1)",
+])
+def test_rejects_unsafe_or_multiple_statements(sql):
+    with pytest.raises(UnsafeSQLError):
+        check_sql_allowed(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT 'DROP TABLE x; --' AS a, [select] FROM t -- trailing comment",
+    "SELECT 1 AS x /* comment with ' quote */",
+    "SELECT 1 UNION ALL SELECT 2 EXCEPT SELECT 3",
+    "SELECT * FROM t WHERE id IN (SELECT id FROM u) ORDER BY id OFFSET 0 ROWS FETCH NEXT 5 ROWS ONLY",
+    "SELECT TOP 5 WITH TIES name, CASE WHEN x = 1 THEN 'a' ELSE 'b' END FROM t WITH (NOLOCK) ORDER BY x",
+    "WITH a AS (SELECT 1 AS x), b AS (SELECT 2 AS x) SELECT * FROM a UNION SELECT * FROM b",
+    "DBCC SQLPERF(LOGSPACE) WITH NO_INFOMSGS",
+    "EXEC sp_who2 'active'",
+    "EXEC [dbo].[sp_whoisactive]",
+    "SELECT N'it''s' AS a;",
+])
+def test_allows_single_read_only_statement(sql):
+    assert check_sql_allowed(sql) == sql
+
+
+@pytest.mark.parametrize("name, sql", [query for queries in DIAGNOSTIC_QUERIES.values() for query in queries])
+def test_canned_diagnostics_pass_the_guard(name, sql):
+    check_sql_allowed(sql)
+
+
+def test_mask_keeps_positions():
+    sql = "SELECT 'a;b' /* c;d */ AS x; SELECT 2 -- e;f\n"
+    assert len(mask_sql(sql)) == len(sql)
+    assert split_statements(sql) == ["SELECT 'a;b' /* c;d */ AS x", "SELECT 2 -- e;f"]
@@ -0,0 +1,47 @@
+import os
+
+from agents.jira_agent import CSV_BUNDLE_NAME, upload_attachments
+
+
+class FakeIssue:
+    key = "TEST-1"
+
+
+class FakeJira:
+    def __init__(self):
+        self.attached = []
+
+    def add_attachment(self, issue, attachment, filename=None):
+        self.attached.append(filename)
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_result_files_are_bundled(tmp_path):
+    files = [write(tmp_path / f"query_result_step_{i}.csv", b"a,b\n1,2\n" * 100) for i in range(3)]
+    jira = FakeJira()
+
+    upload_attachments(jira, FakeIssue(), files)
+
+    assert jira.attached == [CSV_BUNDLE_NAME]
+
+
+def test_oversized_bundle_falls_back_to_single_files(tmp_path):
+    # Incompressible results: 3 x 0.4 MB fit the 1 MB limit one by one, their zip does not
+    files = [write(tmp_path / f"query_result_step_{i}.csv", os.urandom(400 * 1024)) for i in range(3)]
+    jira = FakeJira()
+
+    attached = upload_attachments(jira, FakeIssue(), files, max_file_mb=1)
+
+    assert sorted(attached) == sorted(os.path.basename(p) for p in files)
+    assert not os.path.exists(tmp_path / CSV_BUNDLE_NAME)
+
+
+def test_duplicate_content_is_uploaded_once(tmp_path):
+    files = [write(tmp_path / "report.pdf", b"%PDF"), write(tmp_path / "copy.pdf", b"%PDF")]
+    jira = FakeJira()
+
+    assert len(upload_attachments(jira, FakeIssue(), files)) == 1
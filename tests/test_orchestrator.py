@@ -0,0 +1,112 @@
+import pytest
+
+import orchestrator
+from incident_index import IncidentIndex
+from llm_client import LLMError
+from log_triage import LogTriage
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """Orchestrator with stubbed agents and a throwaway incident index; returns the index and ticket calls."""
+    monkeypatch.chdir(tmp_path)
+    index = IncidentIndex(str(tmp_path / "incidents.sqlite"))
+    tickets = []
+    monkeypatch.setattr(orchestrator, "JIRA_DEDUP", True)
+    monkeypatch.setattr(orchestrator, "get_incident_index", lambda: index)
+    monkeypatch.setattr(orchestrator, "get_incident_kb", lambda: None)
+    monkeypatch.setattr(orchestrator, "get_llm_cache", lambda: None)
+    monkeypatch.setattr(orchestrator, "log_agent", lambda user_input: "Timeout expired in OrderService.Save")
+    monkeypatch.setattr(orchestrator, "decision_agent",
+                        lambda summary: '{"run_code_agent": true, "run_db_agent": false}')
+    monkeypatch.setattr(orchestrator, "retrieve_relevant_code", lambda path, summary: "")
+    monkeypatch.setattr(orchestrator, "generate_report", lambda path, *args, **kwargs: path)
+    monkeypatch.setattr(orchestrator, "jira_agent", lambda data: tickets.append(data) or "TEST-1")
+    return index, tickets
+
+
+def triage():
+    return LogTriage().feed(["2024-01-01 10:00:00 ERROR Timeout expired in OrderService.Save"])
+
+
+def incident_rows(index):
+    return index._conn.execute("SELECT fingerprint, issue_key FROM incidents").fetchall()
+
+
+def test_llm_failure_leaves_no_incident_record(pipeline, monkeypatch):
+    index, tickets = pipeline
+
+    def code_agent(*args):
+        raise LLMError("LLM request failed after 4 attempts")
+    monkeypatch.setattr(orchestrator, "code_agent", code_agent)
+
+    result = orchestrator.orchestrator(triage())
+
+    assert result["timings"]["code"]["status"] == "error"
+    assert result["timings"]["jira"]["status"] == "skipped_failed"
+    assert result["jira_ticket"] is None
+    assert tickets == []
+    assert incident_rows(index) == []
+
+
+def test_successful_run_records_its_ticket(pipeline, monkeypatch):
+    index, tickets = pipeline
+    monkeypatch.setattr(orchestrator, "code_agent", lambda *args: "OrderService.Save holds a lock")
+
+    result = orchestrator.orchestrator(triage())
+
+    assert result["jira_ticket"] == "TEST-1"
+    assert len(tickets) == 1
+    assert incident_rows(index) == [(result["fingerprint"], "TEST-1")]
+
+
+class StubKB:
+    def __init__(self, score):
+        self.match = {"id": 7, "score": score, "jira_key": "TEST-0", "log_summary": "Timeout expired",
+                      "decision": {}, "code_analysis": "OrderService.Save holds a lock", "db_result": "",
+                      "sql_queries": []}
+
+    def best_match(self, signature, log_summary):
+        return dict(self.match)
+
+    def document(self, incident_id, record):
+        return f"[Incident #{incident_id}]"
+
+    def add(self, record):
+        return 8
+
+
+def run_with_match(pipeline, monkeypatch, score, semantic):
+    calls = {"code": 0, "db": []}
+    monkeypatch.setattr(orchestrator, "get_incident_kb", lambda: StubKB(score))
+    monkeypatch.setattr("vector_db_client.embeddings_are_semantic", lambda: semantic)
+    monkeypatch.setattr(orchestrator, "decision_agent",
+                        lambda summary: '{"run_code_agent": true, "run_db_agent": true}')
+    monkeypatch.setattr(orchestrator, "code_agent",
+                        lambda *args: calls.update(code=calls["code"] + 1) or "fresh analysis")
+    monkeypatch.setattr(orchestrator, "db_agent", lambda config: calls["db"].append(config) or "db analysis")
+    result = orchestrator.orchestrator(triage())
+    return result, calls
+
+
+def test_near_identical_incident_reuses_its_analysis(pipeline, monkeypatch):
+    result, calls = run_with_match(pipeline, monkeypatch, score=0.97, semantic=True)
+
+    assert calls["code"] == 0
+    assert "OrderService.Save holds a lock" in result["code_analysis"]
+    assert calls["db"][0]["max_llm_steps"] == 0
+
+
+def test_hash_embeddings_only_give_a_hint(pipeline, monkeypatch):
+    result, calls = run_with_match(pipeline, monkeypatch, score=0.99, semantic=False)
+
+    assert calls["code"] == 1
+    assert "max_llm_steps" not in calls["db"][0]
+    assert calls["db"][0]["similar_incident"] == "[Incident #7]"
+
+
+def test_close_match_below_reuse_score_only_gives_a_hint(pipeline, monkeypatch):
+    result, calls = run_with_match(pipeline, monkeypatch, score=0.9, semantic=True)
+
+    assert calls["code"] == 1
+    assert "max_llm_steps" not in calls["db"][0]
@@ -0,0 +1,111 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from vector_db_client import SimpleVectorDB, _read_manifest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def vector(i, dim=8):
+    v = np.zeros(dim, dtype="float32")
+    v[i % dim] = 1.0
+    v[(i + 1) % dim] = 0.5
+    return v
+
+
+def assert_consistent(db):
+    """Every text is still paired with the vector it was added with."""
+    assert len(db) == len(db.texts)
+    for row, text in enumerate(db.texts):
+        expected = SimpleVectorDB._normalize(vector(int(text.split("-")[1])))[0]
+        np.testing.assert_allclose(db._matrix[row], expected, rtol=1e-6)
+
+
+def test_saves_from_two_stores_are_merged(tmp_path):
+    path = str(tmp_path / "kb")
+    first = SimpleVectorDB.load(path)
+    second = SimpleVectorDB.load(path)
+    first.add("a-0", vector(0))
+    second.add("b-1", vector(1))
+    second.add("b-2", vector(2))
+
+    first.save(path)
+    second.save(path)
+
+    # The later saver mirrors the file order: the rows saved first come before its own
+    assert second.texts == ["a-0", "b-1", "b-2"]
+    assert _read_manifest(path)["count"] == 3
+    reloaded = SimpleVectorDB.load(path)
+    assert reloaded.texts == ["a-0", "b-1", "b-2"]
+    assert_consistent(reloaded)
+    assert_consistent(second)
+
+
+def test_refresh_picks_up_rows_saved_elsewhere(tmp_path):
+    path = str(tmp_path / "kb")
+    reader = SimpleVectorDB.load(path)
+    writer = SimpleVectorDB.load(path)
+    writer.add("w-3", vector(3))
+    writer.save(path)
+
+    reader.refresh(path)
+
+    assert reader.texts == ["w-3"]
+    assert_consistent(reader)
+
+
+def test_refresh_waits_for_unsaved_rows(tmp_path):
+    path = str(tmp_path / "kb")
+    reader = SimpleVectorDB.load(path)
+    writer = SimpleVectorDB.load(path)
+    writer.add("w-3", vector(3))
+    writer.save(path)
+    reader.add("r-4", vector(4))
+
+    reader.refresh(path)
+    assert reader.texts == ["r-4"]
+    reader.save(path)
+    assert reader.texts == ["w-3", "r-4"]
+    assert_consistent(reader)
+
+
+def test_concurrent_processes_lose_no_rows(tmp_path):
+    path = str(tmp_path / "kb")
+    script = (
+        "import sys, numpy as np\n"
+        "from vector_db_client import SimpleVectorDB\n"
+        "path, worker = sys.argv[1], int(sys.argv[2])\n"
+        "db = SimpleVectorDB.load(path)\n"
+        "for i in range(20):\n"
+        "    v = np.zeros(8, dtype='float32'); v[i % 8] = 1.0; v[(i + 1) % 8] = 0.5\n"
+        "    db.add(f'{worker}-{i}', v)\n"
+        "    db.save(path)\n"
+    )
+    workers = [subprocess.Popen([sys.executable, "-c", script, path, str(worker)], cwd=ROOT) for worker in range(3)]
+    assert [worker.wait(timeout=120) for worker in workers] == [0, 0, 0]
+
+    reloaded = SimpleVectorDB.load(path)
+    assert sorted(reloaded.texts) == sorted(f"{worker}-{i}" for worker in range(3) for i in range(20))
+    assert_consistent(reloaded)
+
+
+def test_bytes_left_by_an_interrupted_save_are_ignored(tmp_path):
+    path = str(tmp_path / "kb")
+    db = SimpleVectorDB.load(path)
+    db.add("a-0", vector(0))
+    db.save(path)
+    # A save that died after writing its rows but before swapping the manifest
+    with open(path + ".vectors.f32", "ab") as f:
+        f.write(vector(5).tobytes() * 3)
+    with open(path + ".texts.jsonl", "ab") as f:
+        f.write(b'"lost-5"\n"lost-5"\n"lo')
+
+    db.add("b-1", vector(1))
+    db.save(path)
+
+    reloaded = SimpleVectorDB.load(path)
+    assert reloaded.texts == ["a-0", "b-1"]
+    assert_consistent(reloaded)
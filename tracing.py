@@ -0,0 +1,193 @@
+import json
+import time
+import uuid
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Numeric span attributes summed per span name in the run summary
+SUMMED_ATTRIBUTES = ("prompt_tokens", "completion_tokens", "total_tokens", "prompt_chars", "rows", "bytes")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, trace, name, kind, parent_id, attributes):
+        self.trace = trace
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.kind = kind
+        self.parent_id = parent_id
+        self.attributes = dict(attributes)
+        self.thread = threading.current_thread().name
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, **counters):
+        for key, value in counters.items():
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def fail(self, error):
+        """Marks the span failed without an exception escaping it (e.g. errors returned as values)."""
+        self.status = "error"
+        self.error = str(error)
+
+    def to_dict(self):
+        return {
+            "id": self.id, "parent_id": self.parent_id, "name": self.name, "kind": self.kind,
+            "thread": self.thread, "start": round(self.start - self.trace.start, 4),
+            "seconds": round(self.seconds, 4) if self.seconds is not None else None,
+            "status": self.status, "error": self.error, "attributes": self.attributes,
+        }
+
+
+class NoopSpan:
+    """Returned when no trace is active, so instrumented code never has to check."""
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, **counters):
+        pass
+
+    def fail(self, error):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Trace:
+    """
+    Spans of one run: wall time, status, error and free-form attributes (token usage,
+    prompt size, cache hits, SQL text, rows, bytes...) with their parent/child links.
+    """
+
+    def __init__(self, name, **attributes):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = dict(attributes)
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def _record(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self):
+        """Per span name: calls, errors, total/max seconds and summed numeric attributes, slowest first."""
+        rows = {}
+        with self._lock:
+            spans = [s for s in self.spans if s.seconds is not None]
+        for span in spans:
+            row = rows.setdefault(span.name, {"name": span.name, "kind": span.kind, "calls": 0, "errors": 0,
+                                              "seconds": 0.0, "max_seconds": 0.0, "cache_hits": 0})
+            row["calls"] += 1
+            row["errors"] += span.status == "error"
+            row["seconds"] += span.seconds
+            row["max_seconds"] = max(row["max_seconds"], span.seconds)
+            row["cache_hits"] += bool(span.attributes.get("cache_hit"))
+            for key in SUMMED_ATTRIBUTES:
+                if isinstance(span.attributes.get(key), (int, float)):
+                    row[key] = row.get(key, 0) + span.attributes[key]
+        return sorted(rows.values(), key=lambda row: row["seconds"], reverse=True)
+
+    def to_dict(self):
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {"id": self.id, "name": self.name, "started_at": self.started_at,
+                "seconds": round(time.perf_counter() - self.start, 4), "attributes": self.attributes,
+                "summary": self.summary(), "spans": spans}
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+
+@contextmanager
+def start_trace(name, **attributes):
+    """
+    Starts a trace and makes it current for the block (and the worker threads bound to it).
+    The previous trace is restored on exit, so a reused worker thread never records into it.
+    """
+    trace = Trace(name, **attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    """Times a block as a child of the current span; errors are recorded and re-raised."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield NOOP_SPAN
+        return
+    parent = _current_span.get()
+    current = Span(trace, name, kind, parent.id if parent else None, attributes)
+    trace._record(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.seconds = time.perf_counter() - current.start
+        _current_span.reset(token)
+
+
+def traced(name=None, kind="internal"):
+    """Decorator form of span(), named after the function by default."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(func):
+    """
+    Binds func to the caller's trace context. Thread pools do not propagate context
+    variables, so work submitted to an executor is wrapped with this to keep its spans
+    attached to the submitting span.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time: run each call in its own copy
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
+
+def print_trace_summary(trace, top=15):
+    print(f"🔎 Trace {trace.id[:8]} ({time.perf_counter() - trace.start:.2f}s):")
+    print(f"   {'span':<28} {'calls':>5} {'errors':>6} {'total s':>8} {'max s':>7} {'tokens':>8} {'cache':>5}")
+    for row in trace.summary()[:top]:
+        tokens = row.get("total_tokens") or (row.get("prompt_tokens", 0) + row.get("completion_tokens", 0))
+        print(f"   {row['name'][:28]:<28} {row['calls']:>5} {row['errors']:>6} {row['seconds']:>8.2f} "
+              f"{row['max_seconds']:>7.2f} {tokens or '':>8} {row['cache_hits'] or '':>5}")
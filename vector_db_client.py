@@ -1,63 +1,493 @@
-from openai import OpenAI
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
 import numpy as np
 
-client = OpenAI(api_key="your_api_key")  # Replace with your API key
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "hash")  # "hash" (local) or "openai"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite"))
+VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", os.path.join(".cache", "incident_kb"))
+
+
+class EmbeddingProvider:
+    """Turns a batch of texts into a (len(texts), dim) float32 matrix."""
+    name = "base"
+    # Whether close vectors mean close meaning, not just shared words
+    semantic = False
+
+    def embed_many(self, texts):
+        raise NotImplementedError
+
+
+class HashEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic local fallback: feature-hashes word unigrams and bigrams into a
+    signed bag-of-words vector. Stable across processes (no use of hash() or the
+    global numpy random state), and texts sharing words get similar vectors.
+    """
+
+    TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.name = f"hash-{dim}"
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype="float32")
+        tokens = [t.lower() for t in self.TOKEN_PATTERN.findall(text)]
+        for feature in tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+    def embed_many(self, texts):
+        return np.stack([self._embed(text) for text in texts]) if texts else np.empty((0, self.dim), "float32")
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API, sending up to batch_size texts per request."""
+    semantic = True
+
+    def __init__(self, model="text-embedding-3-small", batch_size=256):
+        self.model = model
+        self.batch_size = batch_size
+        self.name = f"openai-{model}"
+        self._client = None
+
+    def embed_many(self, texts):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            response = self._client.embeddings.create(input=texts[i:i + self.batch_size], model=self.model)
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+        return np.asarray(vectors, dtype="float32")
+
+
+class EmbeddingCache:
+    """On-disk (SQLite) cache of embeddings keyed by a hash of provider name and text."""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(provider_name, text):
+        return hashlib.sha256(f"{provider_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                query = f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})"
+                for key, blob in self._conn.execute(query, batch):
+                    found[key] = np.frombuffer(blob, dtype="float32")
+        return found
+
+    def set_many(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype="float32").tobytes()) for key, vector in items],
+            )
+            self._conn.commit()
+
+
+class EmbeddingPipeline:
+    """Batched embedding with a persistent cache: only texts never seen before are computed."""
+
+    def __init__(self, provider, cache=None):
+        self.provider = provider
+        self.cache = cache
+
+    def embed_many(self, texts):
+        texts = list(texts)
+        if not self.cache or not texts:
+            return self.provider.embed_many(texts)
+        keys = [EmbeddingCache.key(self.provider.name, text) for text in texts]
+        cached = self.cache.get_many(list(set(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.provider.embed_many(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.set_many(computed.items())
+            cached.update(computed)
+        return np.stack([cached[key] for key in keys])
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_embedding_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                provider = OpenAIEmbeddingProvider() if EMBEDDING_PROVIDER == "openai" else HashEmbeddingProvider()
+                _pipeline = EmbeddingPipeline(provider, EmbeddingCache())
+    return _pipeline
+
+
+def embed_texts(texts):
+    return get_embedding_pipeline().embed_many(texts)
+
 
 def embed_text(text):
-    # Use OpenAI's embedding API
-    response = client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"  # Or another available embedding model
-    )
-    embedding = response.data[0].embedding
-    return np.array(embedding)
+    return embed_texts([text])[0]
+
+
+def embeddings_are_semantic():
+    return get_embedding_pipeline().provider.semantic
 
 # Example: Using FAISS for local vector search (for demo purposes)
 # In production, use Pinecone, Weaviate, Qdrant, etc.
 
-try:
-    import faiss
-except ImportError:
-    faiss = None
+_faiss = None
+
+
+def get_faiss():
+    """Imports faiss on first use; returns None when it is not installed."""
+    global _faiss
+    if _faiss is None:
+        try:
+            import faiss
+            _faiss = faiss
+        except ImportError:
+            _faiss = False
+    return _faiss or None
+
+
+def _write_aside(path, write):
+    # Written to a temporary file and swapped in: readers see the old or the new file, never
+    # a partial one, and a file another store has open or memory-mapped is not overwritten
+    temp_path = path + ".tmp"
+    write(temp_path)
+    os.replace(temp_path, path)
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock shared by every process using the same lock file."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after about 10 seconds
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _read_manifest(path):
+    try:
+        with open(path + ".manifest.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_at(path, offset, data):
+    # Appends at the end recorded in the manifest, over any bytes left by an interrupted save. Never
+    # truncated: other processes may have the file memory-mapped (Windows refuses that), and readers
+    # stop at the manifest's row count anyway
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def _dump_json(path, value):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+
 
 class SimpleVectorDB:
-    def __init__(self):
-        self.embeddings = []
+    """
+    In-memory vector store with cosine scoring.
+    Embeddings are L2-normalized into a growable contiguous float32 matrix, so adding
+    is amortized O(1) and searching needs no per-query allocation of the corpus.
+    When faiss is installed the matrix is mirrored into a persistent faiss index that
+    is updated incrementally: "flat" (exact), "ivf" (trained once enough vectors exist)
+    or "hnsw" for large corpora.
+    """
+
+    def __init__(self, index_type="flat", initial_capacity=1024, nlist=100, hnsw_m=32):
+        self.index_type = index_type
+        self.initial_capacity = initial_capacity
+        self.nlist = nlist
+        self.hnsw_m = hnsw_m
         self.texts = []
+        self._matrix = None
+        self._count = 0
+        self._index = None
+        self._indexed = 0
+        # Rows (and bytes of texts) mirrored in the files of the last load/save
+        self._persisted = 0
+        self._texts_bytes = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype="float32")
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _ensure_capacity(self, extra, dim):
+        needed = self._count + extra
+        if self._matrix is not None and needed <= self._matrix.shape[0]:
+            return
+        capacity = max(self.initial_capacity, needed, 2 * (self._matrix.shape[0] if self._matrix is not None else 0))
+        matrix = np.empty((capacity, dim), dtype="float32")
+        if self._count:
+            matrix[:self._count] = self._matrix[:self._count]
+        self._matrix = matrix
 
     def add(self, text, embedding):
-        self.texts.append(text)
-        self.embeddings.append(embedding)
-
-    def search(self, query_embedding, top_k=3):
-        if not self.embeddings:
-            return []
-        emb_matrix = np.array(self.embeddings).astype("float32")
-        query_emb = np.array(query_embedding).astype("float32").reshape(1, -1)
-        if faiss:
-            index = faiss.IndexFlatL2(emb_matrix.shape[1])
-            index.add(emb_matrix)
-            _, idxs = index.search(query_emb, top_k)
-            return [self.texts[i] for i in idxs[0]]
+        self.add_many([text], [embedding])
+
+    def add_many(self, texts, embeddings):
+        if not len(texts):
+            return
+        vectors = self._normalize(embeddings)
+        if len(texts) != len(vectors):
+            raise ValueError("texts and embeddings must have the same length")
+        with self._lock:
+            if self._matrix is not None and vectors.shape[1] != self._matrix.shape[1]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != {self._matrix.shape[1]}")
+            self._ensure_capacity(len(vectors), vectors.shape[1])
+            self._matrix[self._count:self._count + len(vectors)] = vectors
+            self._count += len(vectors)
+            self.texts.extend(texts)
+
+    def _build_index(self, dim):
+        faiss = get_faiss()
+        metric = faiss.METRIC_INNER_PRODUCT
+        if self.index_type == "hnsw":
+            return faiss.IndexHNSWFlat(dim, self.hnsw_m, metric)
+        if self.index_type == "ivf":
+            # IVF needs training data; until there is enough, search the matrix exactly
+            if self._count < self.nlist * 39:
+                return None
+            index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, self.nlist, metric)
+            index.train(self._matrix[:self._count])
+            index.nprobe = max(1, self.nlist // 10)
+            return index
+        return faiss.IndexFlatIP(dim)
+
+    def _sync_index(self):
+        """Adds vectors appended since the last search to the faiss index."""
+        if get_faiss() is None:
+            return None
+        if self._index is None:
+            self._index = self._build_index(self._matrix.shape[1])
+            self._indexed = 0
+            if self._index is None:
+                return None
+        if self._indexed < self._count:
+            self._index.add(np.ascontiguousarray(self._matrix[self._indexed:self._count]))
+            self._indexed = self._count
+        return self._index
+
+    def search_many(self, query_embeddings, top_k=3, with_scores=False):
+        """Returns, for each query, the top_k texts (or (text, cosine score) pairs)."""
+        queries = self._normalize(query_embeddings)
+        with self._lock:
+            if not self._count:
+                return [[] for _ in queries]
+            top_k = min(top_k, self._count)
+            index = self._sync_index()
+            if index is not None:
+                scores, idxs = index.search(queries, top_k)
+            else:
+                all_scores = queries @ self._matrix[:self._count].T
+                idxs = np.argpartition(-all_scores, top_k - 1, axis=1)[:, :top_k]
+                scores = np.take_along_axis(all_scores, idxs, axis=1)
+                order = np.argsort(-scores, axis=1)
+                idxs = np.take_along_axis(idxs, order, axis=1)
+                scores = np.take_along_axis(scores, order, axis=1)
+
+            results = []
+            for row_scores, row_idxs in zip(scores, idxs):
+                hits = [(self.texts[i], float(score)) for score, i in zip(row_scores, row_idxs) if i >= 0]
+                results.append(hits if with_scores else [text for text, _ in hits])
+            return results
+
+    def search(self, query_embedding, top_k=3, with_scores=False):
+        return self.search_many([query_embedding], top_k=top_k, with_scores=with_scores)[0]
+
+    def _load_rows(self, path, manifest):
+        """Appends the rows saved at path past the ones this store already mirrors."""
+        count, dim = manifest["count"], manifest["dim"]
+        if count <= self._persisted:
+            return
+        vectors_path = path + ".vectors.f32"
+        if self._count == 0:
+            # Memory-mapped: only copied once new vectors are added
+            self._matrix = np.memmap(vectors_path, dtype="float32", mode="r", shape=(count, dim))
         else:
-            # Fallback: cosine similarity
-            scores = emb_matrix @ query_emb.T
-            top_idxs = np.argsort(scores.flatten())[::-1][:top_k]
-            return [self.texts[i] for i in top_idxs]
+            rows = np.fromfile(vectors_path, dtype="float32", count=(count - self._persisted) * dim,
+                               offset=self._persisted * dim * 4).reshape(-1, dim)
+            self._ensure_capacity(len(rows), dim)
+            self._matrix[self._count:count] = rows
+        with open(path + ".texts.jsonl", "rb") as f:
+            f.seek(self._texts_bytes)
+            data = f.read(manifest["texts_bytes"] - self._texts_bytes)
+        self.texts.extend(json.loads(line) for line in data.decode("utf-8").splitlines())
+        self._count = self._persisted = count
+        self._texts_bytes = manifest["texts_bytes"]
+
+    def save(self, path):
+        """
+        Appends the vectors added since the last load/save to the store at path. The store is
+        <path>.vectors.f32 and <path>.texts.jsonl, which only grow, plus <path>.manifest.json,
+        swapped in last, giving the number of valid rows: readers never see a half-written
+        save. Saves are serialized by <path>.lock across processes, and rows other processes
+        saved meanwhile are merged into this store. With faiss, the index is saved as
+        <path>.<rows>.faiss and rewritten only once the store doubled since.
+        """
+        with self._lock:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with _file_lock(path + ".lock"):
+                manifest = _read_manifest(path) or {"count": 0, "dim": None, "texts_bytes": 0,
+                                                    "faiss": None, "faiss_count": 0}
+                new_texts = self.texts[self._persisted:self._count]
+                if new_texts:
+                    dim = self._matrix.shape[1]
+                    if manifest["dim"] not in (None, dim):
+                        raise ValueError(f"Embedding dimension {dim} != {manifest['dim']} of {path}")
+                    vectors = np.ascontiguousarray(self._matrix[self._persisted:self._count])
+                    lines = "".join(json.dumps(text) + "\n" for text in new_texts).encode("utf-8")
+                    _write_at(path + ".vectors.f32", manifest["count"] * dim * 4, vectors.tobytes())
+                    _write_at(path + ".texts.jsonl", manifest["texts_bytes"], lines)
+                    manifest = {**manifest, "dim": dim, "count": manifest["count"] + len(new_texts),
+                                "texts_bytes": manifest["texts_bytes"] + len(lines)}
+                    _write_aside(path + ".manifest.json", lambda temp: _dump_json(temp, manifest))
+
+                    if manifest["count"] - len(new_texts) != self._persisted:
+                        # Other processes saved first: mirror the file order, which puts their rows before ours
+                        self._count = self._persisted
+                        del self.texts[self._persisted:]
+                        if self._indexed > self._persisted:
+                            self._index = None
+                    else:
+                        self._persisted = self._count
+                        self._texts_bytes = manifest["texts_bytes"]
+                self._load_rows(path, manifest)
+                if self._count and manifest["faiss_count"] * 2 <= self._count and self._sync_index() is not None:
+                    self._save_index(path, manifest)
+
+    def _save_index(self, path, manifest):
+        old_index = manifest.get("faiss")
+        index_name = f"{os.path.basename(path)}.{self._count}.faiss"
+        index_path = os.path.join(os.path.dirname(path), index_name)
+        _write_aside(index_path, lambda temp: get_faiss().write_index(self._index, temp))
+        manifest = {**manifest, "faiss": index_name, "faiss_count": self._count}
+        _write_aside(path + ".manifest.json", lambda temp: _dump_json(temp, manifest))
+        if old_index and old_index != index_name:
+            try:
+                os.remove(os.path.join(os.path.dirname(path), old_index))
+            except OSError:
+                pass  # still open in another process (Windows): left behind
+
+    def refresh(self, path):
+        """Picks up the rows other processes saved to path since this store was loaded or saved."""
+        with self._lock:
+            # Unsaved rows of this store are merged on its next save instead
+            if self._count != self._persisted:
+                return
+            manifest = _read_manifest(path)
+            if manifest and manifest["count"] > self._persisted:
+                self._load_rows(path, manifest)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Loads a saved store; vectors are memory-mapped and only copied once new ones are added."""
+        db = cls(**kwargs)
+        manifest = _read_manifest(path)
+        if manifest is None:
+            return db
+        db._load_rows(path, manifest)
+        faiss = get_faiss()
+        index_path = os.path.join(os.path.dirname(path), manifest["faiss"]) if manifest.get("faiss") else None
+        if faiss is not None and index_path and os.path.exists(index_path):
+            # Covers the first faiss_count rows, the rest are added on the first search
+            db._index = faiss.read_index(index_path)
+            db._indexed = db._index.ntotal
+        return db
+
+
+# Process-wide store of past incident knowledge (see incident_kb.py), loaded from disk on first use
+_vector_db = None
+_vector_db_lock = threading.Lock()
+
+
+def get_vector_db():
+    global _vector_db
+    if _vector_db is None:
+        with _vector_db_lock:
+            if _vector_db is None:
+                _vector_db = SimpleVectorDB.load(VECTOR_DB_PATH)
+    return _vector_db
+
+
+def save_vector_db():
+    get_vector_db().save(VECTOR_DB_PATH)
+
+
+def add_context(text, key_text=None):
+    add_contexts([text], [key_text] if key_text else None)
+
+
+def add_contexts(texts, key_texts=None):
+    """Adds texts to the store, embedded from key_texts when given (e.g. a signature instead of the full text)."""
+    texts = list(texts)
+    if not texts:
+        return
+    get_vector_db().add_many(texts, embed_texts(list(key_texts) if key_texts else texts))
 
-# Dummy embedding function (replace with real model, e.g., OpenAI, HuggingFace)
-def embed_text(text):
-    # For demo: hash-based pseudo-embedding
-    np.random.seed(abs(hash(text)) % (2**32))
-    return np.random.rand(512)
 
-# Global vector DB instance
-vector_db = SimpleVectorDB()
+def search_context(query, top_k=3):
+    """[(text, cosine score)] of the texts closest to the query."""
+    db = get_vector_db()
+    # Incidents stored by other processes (service, batch, follow) since this one loaded the store
+    db.refresh(VECTOR_DB_PATH)
+    return db.search(embed_text(query), top_k=top_k, with_scores=True)
 
-def add_context(text):
-    embedding = embed_text(text)
-    vector_db.add(text, embedding)
 
 def get_relevant_context(query, top_k=3):
-    query_embedding = embed_text(query)
-    return "\n---\n".join(vector_db.search(query_embedding, top_k=top_k))
\ No newline at end of file
+    return "\n---\n".join(text for text, _ in search_context(query, top_k=top_k))